@@ -0,0 +1,172 @@
+#! /usr/bin/env python
+#
+# End-to-end benchmarks of ncclient against the stand-in NETCONF server in
+# server.py, driven through the stdio transport (or the in-process loopback
+# transport, which takes process spawning out of the picture). Measures connect and hello
+# time, synchronous RPC latency, asynchronous RPC throughput and the time
+# to receive and decode large get-config replies, for both base:1.0 and
+# base:1.1 framing. Results are written as JSON so that runs can be
+# compared against each other.
+#
+# $ ./bench.py -o results.json
+
+import sys, os, time, json, logging, argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ncclient import manager
+
+import server
+
+SERVER = os.path.join(HERE, 'server.py')
+
+def server_cmd(base, data_size=0):
+    return [sys.executable, SERVER, '--base', base, '--data-size', str(data_size)]
+
+def summary(samples):
+    "min/median/mean/p95/max of a list of durations in seconds"
+    s = sorted(samples)
+    n = len(s)
+    return {
+        'n': n,
+        'min': s[0],
+        'median': s[n // 2],
+        'mean': sum(s) / n,
+        'p95': s[min(n - 1, int(n * 0.95))],
+        'max': s[-1],
+    }
+
+def connect(base, args, data_size=0):
+    if args.transport == 'loopback':
+        m = manager.connect_loopback(server.responder(base, data_size))
+    else:
+        m = manager.connect_stdio(server_cmd(base, data_size))
+    m.timeout = args.timeout
+    return m
+
+def close(m):
+    try:
+        m.close_session()
+    except Exception:
+        pass
+
+def bench_connect(base, args):
+    total, hello = [], []
+    for i in range(args.repeat):
+        start = time.time()
+        m = connect(base, args)
+        total.append(time.time() - start)
+        hello.append(m.metrics.hello_duration)
+        close(m)
+    return {'connect': summary(total), 'hello': summary(hello)}
+
+def bench_latency(base, args):
+    m = connect(base, args)
+    try:
+        samples = []
+        for i in range(args.rpcs):
+            start = time.time()
+            m.lock('candidate')
+            samples.append(time.time() - start)
+        return summary(samples)
+    finally:
+        close(m)
+
+def bench_throughput(base, args):
+    m = connect(base, args)
+    try:
+        m.async_mode = True
+        start = time.time()
+        rpcs = [m.lock('candidate') for i in range(args.rpcs)]
+        for rpc in rpcs:
+            rpc.event.wait(args.timeout)
+            if not rpc.event.isSet():
+                raise RuntimeError('timed out waiting for asynchronous reply')
+        elapsed = time.time() - start
+        return {'rpcs': args.rpcs, 'seconds': elapsed, 'rpcs_per_second': args.rpcs / elapsed}
+    finally:
+        close(m)
+
+def bench_decode(base, args):
+    results = {}
+    for size in args.sizes:
+        m = connect(base, args, size)
+        try:
+            start = time.time()
+            reply = m.get_config('running') # synchronous replies come parsed
+            received = time.time()
+            reply.data_xml
+            serialized = time.time()
+            length = len(reply.xml)
+            results[str(size)] = {
+                'bytes': length,
+                'reply': received - start,
+                'data_xml': serialized - received,
+                'mb_per_second': length / (1024.0 * 1024) / (serialized - start),
+            }
+        finally:
+            close(m)
+    return results
+
+BENCHMARKS = [
+    ('connect', bench_connect),
+    ('sync_latency', bench_latency),
+    ('async_throughput', bench_throughput),
+    ('decode', bench_decode),
+]
+
+def run(args):
+    results = {}
+    for base in args.bases:
+        results[base] = {}
+        for name, fn in BENCHMARKS:
+            if args.only and name not in args.only:
+                continue
+            try:
+                results[base][name] = fn(base, args)
+            except Exception as e:
+                # a broken transport should show up in the results, not abort the run
+                results[base][name] = {'error': repr(e)}
+            print >> sys.stderr, 'base:%s %s: %s' % (base, name, json.dumps(results[base][name]))
+    return {
+        'transport': args.transport,
+        'timestamp': time.time(),
+        'python': sys.version,
+        'platform': sys.platform,
+        'results': results,
+    }
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', default='-',
+                        help='file to write the JSON results to [default: stdout]')
+    parser.add_argument('--transport', choices=('stdio', 'loopback'), default='stdio',
+                        help='transport to the stand-in server [default: stdio]')
+    parser.add_argument('--base', action='append', dest='bases', choices=('1.0', '1.1'),
+                        help='framing versions to benchmark [default: both]')
+    parser.add_argument('--only', action='append', choices=[name for name, fn in BENCHMARKS],
+                        help='run only the named benchmark, may be repeated')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='connections for the connect benchmark [default: 20]')
+    parser.add_argument('--rpcs', type=int, default=200,
+                        help='RPCs for the latency and throughput benchmarks [default: 200]')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1 << 20, 10 << 20],
+                        help='get-config reply sizes in bytes [default: 1MB 10MB]')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='timeout for synchronous RPCs in seconds [default: 60]')
+    parser.add_argument('--logging', dest='level_name', default='critical',
+                        help='debug/info/warning/error/critical [default: critical]')
+    args = parser.parse_args()
+    args.bases = args.bases or ['1.0', '1.1']
+    return args
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    logging.basicConfig(level=getattr(logging, args.level_name.upper(), logging.CRITICAL))
+    output = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output == '-':
+        print output
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
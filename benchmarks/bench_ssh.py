@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+#
+# Bulk-reply throughput of the SSH transport against the local SSH server
+# in sshserver.py: a large get-config is fetched with each combination of
+# channel window size and maximum packet size. Results are written as JSON.
+# Requires paramiko.
+#
+# $ ./bench_ssh.py --data-size 52428800 -o ssh.json
+
+import sys, os, time, json, logging, argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ncclient import manager
+from ncclient.capabilities import Capabilities
+from ncclient.transport.ssh import SSHSession
+
+import server
+import sshserver
+
+def connect(port, **kwds):
+    session = SSHSession(Capabilities(manager.CAPABILITIES))
+    session.connect('127.0.0.1', port, username='bench', password='bench',
+                    allow_agent=False, look_for_keys=False,
+                    unknown_host_cb=lambda host, fingerprint: True, **kwds)
+    return manager.Manager(session, timeout=600)
+
+def bench_bulk(port, window_size, max_packet_size, repeat):
+    kwds = {}
+    if window_size:
+        kwds['window_size'] = window_size
+    if max_packet_size:
+        kwds['max_packet_size'] = max_packet_size
+    m = connect(port, **kwds)
+    try:
+        samples = []
+        for i in range(repeat):
+            start = time.time()
+            reply = m.get_config('running')
+            samples.append(time.time() - start)
+        size = len(reply.xml)
+        best = min(samples)
+        return {
+            'window_size': window_size,
+            'max_packet_size': max_packet_size,
+            'bytes': size,
+            'seconds': best,
+            'mb_per_second': size / (1024.0 * 1024) / best,
+            'frames_in': m.metrics.frames_in,
+        }
+    finally:
+        m._session.close()
+
+def run(args):
+    srv = sshserver.SSHServer(lambda: server.responder(args.base, args.data_size))
+    srv.start()
+    results = []
+    for window_size in args.window_sizes:
+        for max_packet_size in args.max_packet_sizes:
+            result = bench_bulk(srv.port, window_size, max_packet_size, args.repeat)
+            print >> sys.stderr, json.dumps(result)
+            results.append(result)
+    return {
+        'timestamp': time.time(),
+        'python': sys.version,
+        'base': args.base,
+        'results': results,
+    }
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', default='-',
+                        help='file to write the JSON results to [default: stdout]')
+    parser.add_argument('--base', choices=('1.0', '1.1'), default='1.1',
+                        help='framing version [default: 1.1]')
+    parser.add_argument('--data-size', type=int, default=20 << 20, dest='data_size',
+                        help='get-config reply size in bytes [default: 20MB]')
+    parser.add_argument('--window-sizes', type=int, nargs='+', default=[0, 1 << 21, 1 << 24],
+                        dest='window_sizes', help='channel window sizes, 0 for the paramiko default')
+    parser.add_argument('--max-packet-sizes', type=int, nargs='+', default=[0, 1 << 15],
+                        dest='max_packet_sizes', help='maximum packet sizes, 0 for the paramiko default')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='fetches per combination, the best is reported [default: 3]')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    logging.basicConfig(level=logging.CRITICAL)
+    output = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output == '-':
+        print output
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
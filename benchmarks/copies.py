@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+#
+# Counts how often the bytes of incoming replies are copied on their way
+# from the transport to the RPCReply, over the in-process loopback
+# transport. A reply is read from the socket straight into the buffer it is
+# handed on in, which is one copy; SessionMetrics.bytes_moved accounts for
+# any further one, e.g. to close the gaps left by base:1.1 chunk headers.
+# The stand-in server splits replies into chunks of each of the given sizes
+# (0 for a single chunk). Results are written as JSON.
+#
+# $ ./copies.py --size 16777216 --chunks 0 65536 4096
+
+import sys, os, time, json, logging, argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ncclient import manager
+from ncclient.transport import LoopbackResponder
+
+import server
+from bench import summary
+
+
+class ChunkingResponder(LoopbackResponder):
+
+    "Sends base:1.1 replies in chunks of *chunk* bytes."
+
+    def __init__(self, chunk, *args, **kwargs):
+        LoopbackResponder.__init__(self, *args, **kwargs)
+        self.chunk = chunk
+
+    def frame(self, msg):
+        if not self.chunked or not self.chunk:
+            return LoopbackResponder.frame(self, msg)
+        chunks = [msg[i:i + self.chunk] for i in xrange(0, len(msg), self.chunk)]
+        return ''.join(['\n#%d\n%s' % (len(c), c) for c in chunks]) + '\n##\n'
+
+
+def run(base, chunk, args):
+    caps = [server.BASE_1_0] + ([server.BASE_1_1] if base == '1.1' else [])
+    m = manager.connect_loopback(ChunkingResponder(chunk, caps, server.build_data(args.size)))
+    metrics = m._session.metrics
+    try:
+        samples = []
+        bytes_in = bytes_moved = 0
+        for i in range(args.repeat):
+            before_in, before_moved = metrics.bytes_in, metrics.bytes_moved
+            start = time.time()
+            reply = m.get()
+            samples.append(time.time() - start)
+            bytes_in += metrics.bytes_in - before_in
+            bytes_moved += metrics.bytes_moved - before_moved
+        if not isinstance(reply._raw, buffer):
+            raise RuntimeError('reply was not kept in its receive buffer')
+        return {
+            'reply_bytes': len(reply._raw),
+            'bytes_in': bytes_in,
+            'bytes_moved': bytes_moved,
+            # the read from the kernel, plus whatever was moved after it
+            'copies_per_byte': 1 + float(bytes_moved) / bytes_in,
+            'reply_seconds': summary(samples),
+        }
+    finally:
+        m.close_session()
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', default='-',
+                        help='file to write the JSON results to [default: stdout]')
+    parser.add_argument('--size', type=int, default=16 * 1024 * 1024,
+                        help='size of the replies in bytes [default: 16MB]')
+    parser.add_argument('--chunks', type=int, nargs='+', default=[0, 65536, 4096],
+                        help='base:1.1 chunk sizes, 0 for a single chunk [default: 0 65536 4096]')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='replies received per case [default: 5]')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    logging.basicConfig(level=logging.CRITICAL)
+    results = {'1.0': run('1.0', 0, args), '1.1': {}}
+    for chunk in args.chunks:
+        results['1.1'][str(chunk)] = run('1.1', chunk, args)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output == '-':
+        print output
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
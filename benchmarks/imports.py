@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+#
+# Measures the cost of starting up with ncclient, each case in a fresh
+# interpreter: importing ncclient.manager, importing it and running a lock
+# over the in-process loopback transport, and importing every transport and
+# operation up front the way the packages used to before they were loaded
+# lazily (see ncclient.lazy). Reports the wall time in milliseconds and the
+# number of modules each case loads. Results are written as JSON.
+#
+# $ ./imports.py --repeat 20
+
+import sys, os, time, json, argparse, subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+CASES = {
+    'import': 'import ncclient.manager',
+    'loopback_lock': '''
+import ncclient.manager
+import server
+m = ncclient.manager.connect_loopback(server.responder('1.1'))
+m.lock('candidate')
+m.close_session()
+''',
+    'eager': '''
+import ncclient.manager
+from ncclient.transport import *
+from ncclient.operations import *
+''',
+}
+
+def child(case):
+    sys.path[:0] = [ROOT, HERE]
+    before = set(sys.modules)
+    start = time.time()
+    exec CASES[case] in {}
+    elapsed = time.time() - start
+    loaded = [k for k in set(sys.modules) - before if sys.modules[k] is not None]
+    return {'ms': elapsed * 1000, 'modules': len(loaded),
+            'ncclient_modules': len([k for k in loaded if k.startswith('ncclient')])}
+
+def run(case, args):
+    samples = []
+    for i in range(args.repeat):
+        out = subprocess.check_output([sys.executable, __file__, '--child', case])
+        samples.append(json.loads(out))
+    ms = sorted(s['ms'] for s in samples)
+    return {
+        'min_ms': ms[0],
+        'median_ms': ms[len(ms) // 2],
+        'modules': samples[-1]['modules'],
+        'ncclient_modules': samples[-1]['ncclient_modules'],
+    }
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', default='-',
+                        help='file to write the JSON results to [default: stdout]')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='fresh interpreters started per case [default: 20]')
+    parser.add_argument('--child', choices=sorted(CASES), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if args.child:
+        print json.dumps(child(args.child))
+        sys.exit()
+    results = {}
+    for case in sorted(CASES):
+        results[case] = run(case, args)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output == '-':
+        print output
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
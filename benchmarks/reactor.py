@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+#
+# Compares sessions running a thread each with sessions sharing a reactor
+# (see ncclient.transport.reactor), all in one process over the loopback
+# transport: connects the requested number of sessions, measures the CPU
+# time the process burns while they sit idle, then the latency of
+# synchronous RPCs issued on them one after the other. Results are written
+# as JSON.
+#
+# $ ./reactor.py --sessions 2000 --idle 10
+
+import sys, os, time, json, logging, argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ncclient import manager
+
+import server
+from bench import summary
+
+def cpu_time():
+    t = os.times()
+    return t[0] + t[1]
+
+def run(mode, args):
+    reactor = True if mode == 'reactor' else None
+    start = time.time()
+    managers = [manager.connect_loopback(server.responder(args.base), reactor=reactor)
+                for i in range(args.sessions)]
+    connected = time.time()
+
+    time.sleep(1) # let the connects settle
+    cpu, wall = cpu_time(), time.time()
+    time.sleep(args.idle)
+    idle_cpu = (cpu_time() - cpu) / (time.time() - wall)
+
+    latency = []
+    for i in range(args.rpcs):
+        m = managers[i % len(managers)]
+        t = time.time()
+        m.lock('candidate')
+        latency.append(time.time() - t)
+
+    for m in managers:
+        m._session.close()
+    for m in managers:
+        if m._session.isAlive():
+            m._session.join()
+    return {
+        'connect_seconds': connected - start,
+        'idle_cpu_percent': idle_cpu * 100,
+        'rpc_latency': summary(latency),
+    }
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', default='-',
+                        help='file to write the JSON results to [default: stdout]')
+    parser.add_argument('--sessions', type=int, default=2000,
+                        help='number of loopback sessions [default: 2000]')
+    parser.add_argument('--idle', type=float, default=10,
+                        help='seconds of idling to measure CPU usage over [default: 10]')
+    parser.add_argument('--rpcs', type=int, default=1000,
+                        help='synchronous RPCs to measure latency over [default: 1000]')
+    parser.add_argument('--base', choices=('1.0', '1.1'), default='1.1',
+                        help='framing version [default: 1.1]')
+    parser.add_argument('--mode', choices=('thread', 'reactor', 'both'), default='both',
+                        help='how sessions run their I/O [default: both]')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    logging.basicConfig(level=logging.CRITICAL)
+    modes = ('thread', 'reactor') if args.mode == 'both' else (args.mode,)
+    results = {'sessions': args.sessions}
+    for mode in modes:
+        results[mode] = run(mode, args)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output == '-':
+        print output
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+#
+# Measures the cost of setting up an RPC, i.e. creating the operation
+# object and registering it with its session's reply listener, with the
+# given numbers of loopback sessions connected in the process (sharing a
+# reactor, see ncclient.transport.reactor). Each case is timed from one
+# thread, and from one thread per session on up to --threads sessions at
+# once, to show whether RPC's on different sessions contend with each
+# other. No requests are sent. Results are written as JSON.
+#
+# $ ./rpc_setup.py --sessions 1 10 100 1000
+
+import sys, os, time, json, logging, argparse
+from threading import Thread
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ncclient import manager, operations
+from ncclient.transport import reactor
+
+import server
+from bench import summary
+
+def setup(session, n):
+    "seconds per RPC set up on *session*, over *n* of them"
+    listener = operations.RPCReplyListener.for_session(session)
+    start = time.time()
+    for i in xrange(n):
+        operations.Lock(session)
+    elapsed = time.time() - start
+    listener._id2rpc.clear() # never sent, nothing to wait for
+    return elapsed / n
+
+def threaded(sessions, n):
+    results = []
+    def run(session):
+        results.append(setup(session, n))
+    threads = [Thread(target=run, args=(s,)) for s in sessions]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(sessions) * n / (time.time() - start)
+
+def run(count, managers, args):
+    sessions = [m._session for m in managers[:count]]
+    samples = [setup(sessions[i % count], args.rpcs) for i in range(args.repeat)]
+    return {
+        'setup_seconds': summary(samples),
+        'threaded_rpcs_per_second': threaded(sessions[:args.threads], args.rpcs),
+    }
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', default='-',
+                        help='file to write the JSON results to [default: stdout]')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 10, 100, 1000],
+                        help='numbers of sessions connected [default: 1 10 100 1000]')
+    parser.add_argument('--rpcs', type=int, default=2000,
+                        help='RPCs set up per sample [default: 2000]')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='samples per case [default: 10]')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='sessions setting up RPCs at once [default: 8]')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    logging.basicConfig(level=logging.CRITICAL)
+    managers = []
+    results = {}
+    for count in sorted(args.sessions):
+        while len(managers) < count:
+            managers.append(manager.connect_loopback(server.responder('1.1'), reactor=True))
+        results[str(count)] = run(count, managers, args)
+    for m in managers:
+        m._session.close()
+    while any(len(r) for r in reactor._reactors):
+        time.sleep(0.01) # let the reactor settle before exiting
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output == '-':
+        print output
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+#
+# A scriptable stand-in NETCONF server speaking over stdin/stdout, for
+# driving ncclient through the stdio transport without a real device.
+# It runs the same responder as the in-process loopback transport, which
+# replies to get and get-config with a <data> element of the requested
+# size, and to every other operation with <ok/>.
+#
+# $ ./server.py --base 1.1 --data-size 1048576
+
+import os, sys, time, argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ncclient.transport.loopback import LoopbackResponder
+
+BASE_1_0 = "urn:ietf:params:netconf:base:1.0"
+BASE_1_1 = "urn:ietf:params:netconf:base:1.1"
+
+CAPABILITIES = [
+    "urn:ietf:params:netconf:capability:writable-running:1.0",
+    "urn:ietf:params:netconf:capability:candidate:1.0",
+    "urn:ietf:params:netconf:capability:confirmed-commit:1.0",
+    "urn:ietf:params:netconf:capability:validate:1.0",
+    "urn:ietf:params:netconf:capability:startup:1.0",
+]
+
+def build_data(size):
+    "A <data> element of roughly *size* bytes."
+    item = '<interface><name>eth%d</name><enabled>true</enabled></interface>'
+    items, total, i = [], 0, 0
+    while total < size:
+        x = item % i
+        items.append(x)
+        total += len(x)
+        i += 1
+    return '<data><interfaces xmlns="urn:example:interfaces">%s</interfaces></data>' % ''.join(items)
+
+def responder(base="1.1", data_size=0, delay=0, session_id=None):
+    caps = [BASE_1_0] + ([BASE_1_1] if base == "1.1" else []) + CAPABILITIES
+    data = build_data(data_size) if data_size else '<data/>'
+    return LoopbackResponder(caps, data, delay, session_id)
+
+def write(fd, data):
+    while data:
+        data = data[os.write(fd, data):]
+
+def serve(responder, rfd=0, wfd=1):
+    write(wfd, responder.hello())
+    while not responder.closed:
+        data = os.read(rfd, 65536)
+        if not data:
+            break
+        replies = responder.feed(data)
+        if replies and responder.delay:
+            time.sleep(responder.delay)
+        write(wfd, replies)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--base', choices=('1.0', '1.1'), default='1.1',
+                        help='highest framing version announced [default: 1.1]')
+    parser.add_argument('--data-size', type=int, default=0, dest='data_size',
+                        help='size of the <data> replied to get/get-config [default: 0]')
+    parser.add_argument('--delay', type=float, default=0,
+                        help='seconds to wait before each reply [default: 0]')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    serve(responder(args.base, args.data_size, args.delay, os.getpid()))
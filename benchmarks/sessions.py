@@ -0,0 +1,70 @@
+#! /usr/bin/env python
+#
+# Stress test of many simultaneous sessions, all in one process over the
+# loopback transport: connects the requested number of sessions, then
+# keeps a round of asynchronous RPCs in flight on every one of them and
+# reports the RPC rate, connect time and reply dispatch figures as JSON.
+#
+# $ ./sessions.py --sessions 1000 --rounds 10
+
+import sys, os, time, json, logging, argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ncclient import manager
+
+import server
+
+def run(args):
+    start = time.time()
+    managers = []
+    for i in range(args.sessions):
+        m = manager.connect_loopback(server.responder(args.base, delay=args.delay))
+        m.async_mode = True
+        managers.append(m)
+    connected = time.time()
+    for i in range(args.rounds):
+        rpcs = [m.lock('candidate') for m in managers]
+        for rpc in rpcs:
+            rpc.event.wait(args.timeout)
+            if not rpc.event.isSet():
+                raise RuntimeError('timed out waiting for asynchronous reply')
+    done = time.time()
+    for m in managers:
+        m._session.close()
+    rpcs = args.sessions * args.rounds
+    return {
+        'sessions': args.sessions,
+        'rounds': args.rounds,
+        'connect_seconds': connected - start,
+        'rpc_seconds': done - connected,
+        'rpcs_per_second': rpcs / (done - connected),
+        'messages_in': sum([m.metrics.messages_in for m in managers]),
+    }
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', default='-',
+                        help='file to write the JSON results to [default: stdout]')
+    parser.add_argument('--sessions', type=int, default=500,
+                        help='number of loopback sessions [default: 500]')
+    parser.add_argument('--rounds', type=int, default=10,
+                        help='RPCs issued on every session [default: 10]')
+    parser.add_argument('--base', choices=('1.0', '1.1'), default='1.1',
+                        help='framing version [default: 1.1]')
+    parser.add_argument('--delay', type=float, default=0,
+                        help='simulated device latency in seconds [default: 0]')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='seconds to wait for each reply [default: 60]')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    logging.basicConfig(level=logging.CRITICAL)
+    output = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output == '-':
+        print output
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+#
+# A local SSH server offering the netconf subsystem, backed by the same
+# responder as the loopback transport. Any username/password is accepted
+# and a fresh host key is generated at startup. Requires paramiko.
+#
+# $ ./sshserver.py --port 8830 --data-size 10485760
+
+import os, sys, socket, threading, logging, argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import paramiko
+
+import server
+
+logger = logging.getLogger('sshserver')
+
+class NetconfSubsystem(paramiko.SubsystemHandler):
+
+    def __init__(self, channel, name, ssh_server, make_responder):
+        paramiko.SubsystemHandler.__init__(self, channel, name, ssh_server)
+        self._make_responder = make_responder
+
+    def start_subsystem(self, name, transport, channel):
+        responder = self._make_responder()
+        channel.sendall(responder.hello())
+        while not responder.closed:
+            data = channel.recv(65536)
+            if not data:
+                break
+            replies = responder.feed(data)
+            if replies:
+                channel.sendall(replies)
+        channel.close()
+
+class Server(paramiko.ServerInterface):
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password,publickey'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+class SSHServer(threading.Thread):
+
+    """Accepts connections on *port* (an ephemeral one by default, see
+    :attr:`port`) and serves each with a responder from *make_responder*."""
+
+    def __init__(self, make_responder, port=0, host_key=None):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self._make_responder = make_responder
+        self._host_key = host_key or paramiko.RSAKey.generate(2048)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', port))
+        self._sock.listen(128)
+        self.port = self._sock.getsockname()[1]
+        self.transports = []
+
+    def run(self):
+        while True:
+            client, addr = self._sock.accept()
+            t = paramiko.Transport(client)
+            t.add_server_key(self._host_key)
+            t.set_subsystem_handler('netconf', NetconfSubsystem, self._make_responder)
+            t.start_server(server=Server())
+            self.transports.append(t)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8830,
+                        help='port to listen on [default: 8830]')
+    parser.add_argument('--base', choices=('1.0', '1.1'), default='1.1',
+                        help='highest framing version announced [default: 1.1]')
+    parser.add_argument('--data-size', type=int, default=0, dest='data_size',
+                        help='size of the <data> replied to get/get-config [default: 0]')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    logging.basicConfig(level=logging.INFO)
+    srv = SSHServer(lambda: server.responder(args.base, args.data_size), args.port)
+    logger.info('listening on 127.0.0.1:%d', srv.port)
+    srv.run()
@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+#
+# Compares the XML engines of ncclient.xml_ (see use_engine) on get
+# replies of the sizes given in megabytes: the time to parse a reply into
+# a tree and to serialize its <data> element again, and the time to pick
+# the elements of one name out of it with iterparse, clearing them as it
+# goes. Every engine and size is measured in a process of its own, which
+# also reports its peak memory. Engines which are not installed are left
+# out. Results are written as JSON.
+#
+# $ ./xml_engines.py --sizes 5 50 500
+
+import sys, os, time, json, resource, argparse, subprocess
+from cStringIO import StringIO
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ncclient import xml_
+from ncclient.xml_ import XMLError, use_engine, to_ele, to_xml, iterparse, qualify
+
+import server
+
+ENGINES = ('etree', 'lxml')
+
+def reply(size):
+    return '<rpc-reply xmlns="%s" message-id="1">%s</rpc-reply>' % (
+        xml_.BASE_NS_1_0, server.build_data(size))
+
+def measure(engine, size):
+    use_engine(engine)
+    raw = reply(size)
+    result = {'reply_bytes': len(raw)}
+
+    t = time.time()
+    root = to_ele(raw)
+    result['parse_seconds'] = time.time() - t
+    t = time.time()
+    to_xml(root.find(qualify('data')))
+    result['serialize_seconds'] = time.time() - t
+    del root
+
+    names = 0
+    t = time.time()
+    for event, ele in iterparse(StringIO(raw), tag=qualify('name', 'urn:example:interfaces')):
+        names += 1
+        ele.clear()
+    result['iterparse_seconds'] = time.time() - t
+    result['iterparse_matches'] = names
+
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return result
+
+def available(engine):
+    try:
+        use_engine(engine)
+    except XMLError:
+        return False
+    return True
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', default='-',
+                        help='file to write the JSON results to [default: stdout]')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[5, 50, 500],
+                        help='reply sizes in megabytes [default: 5 50 500]')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES),
+                        help='engines to compare [default: all installed]')
+    parser.add_argument('--child', nargs=2, metavar=('ENGINE', 'SIZE'),
+                        help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if args.child:
+        print json.dumps(measure(args.child[0], int(args.child[1])))
+        sys.exit()
+    results = {}
+    for engine in args.engines:
+        if not available(engine):
+            results[engine] = 'not installed'
+            continue
+        results[engine] = {}
+        for mb in args.sizes:
+            out = subprocess.check_output([sys.executable, __file__, '--child', engine, str(int(mb * 1024 * 1024))])
+            results[engine]['%gMB' % mb] = json.loads(out)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output == '-':
+        print output
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
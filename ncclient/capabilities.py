@@ -40,14 +40,18 @@ class Capabilities:
         self._dict = {}
         for uri in capabilities:
             self._dict[uri] = _abbreviate(uri)
+        self._reindex()
+
+    def _reindex(self):
+        # the URI's and their shorthands, and the results of missing(), for
+        # as long as the capabilities do not change
+        self._index = set(self._dict)
+        for abbrs in self._dict.itervalues():
+            self._index.update(abbrs)
+        self._missing = {}
 
     def __contains__(self, key):
-        if key in self._dict:
-            return True
-        for abbrs in self._dict.values():
-            if key in abbrs:
-                return True
-        return False
+        return key in self._index
 
     def __len__(self):
         return len(self._dict)
@@ -61,8 +65,24 @@ class Capabilities:
     def add(self, uri):
         "Add a capability."
         self._dict[uri] = _abbreviate(uri)
+        self._reindex()
 
     def remove(self, uri):
         "Remove a capability."
-        if key in self._dict:
-            del self._dict[key]
\ No newline at end of file
+        if uri in self._dict:
+            del self._dict[uri]
+            self._reindex()
+
+    def missing(self, required):
+        "Returns the first of the *required* capabilities, a sequence of URI's or shorthands, which is not available, or `None` if all are. The answer for the same *required* is remembered until a capability is added or removed."
+        key = tuple(required)
+        try:
+            return self._missing[key]
+        except KeyError:
+            for cap in key:
+                if cap not in self._index:
+                    break
+            else:
+                cap = None
+            self._missing[key] = cap
+            return cap
\ No newline at end of file
@@ -0,0 +1,50 @@
+# Copyright 2009 Shikhar Bhushan
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"Packages whose attributes are imported from their submodules on first use, so that importing ncclient only costs what is used."
+
+import sys
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+
+    """Takes the place of the package *module* in :data:`sys.modules`, importing the attributes named in *attrs*, a dictionary of names and the submodules defining them, when they are first looked up. Whatever the package defines itself is available as usual.
+
+    A package makes use of it at the end of its `__init__`::
+
+        sys.modules[__name__] = LazyModule(sys.modules[__name__], {'Session': 'session'})
+    """
+
+    def __init__(self, module, attrs):
+        ModuleType.__init__(self, module.__name__, module.__doc__)
+        self.__dict__.update(module.__dict__)
+        # Python 2 clears the globals of a module object which goes away,
+        # and the package's own functions still refer to those
+        self.__module = module
+        self.__attrs = attrs
+
+    def __getattr__(self, name):
+        # only called for attributes not there yet
+        try:
+            submodule = '%s.%s' % (self.__name__, self.__attrs[name])
+        except KeyError:
+            raise AttributeError("'module' object has no attribute '%s'" % name)
+        __import__(submodule)
+        value = getattr(sys.modules[submodule], name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(self.__attrs))
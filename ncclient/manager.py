@@ -40,24 +40,55 @@ CAPABILITIES = [
 ]
 """A list of URI's representing the client's capabilities. This is used during the initial capability exchange. Modify this if you need to announce some capability not already included."""
 
-OPERATIONS = {
-    "get": operations.Get,
-    "get_config": operations.GetConfig,
-    "dispatch": operations.Dispatch,
-    "edit_config": operations.EditConfig,
-    "copy_config": operations.CopyConfig,
-    "validate": operations.Validate,
-    "commit": operations.Commit,
-    "discard_changes": operations.DiscardChanges,
-    "delete_config": operations.DeleteConfig,
-    "lock": operations.Lock,
-    "unlock": operations.Unlock,
-    "close_session": operations.CloseSession,
-    "kill_session": operations.KillSession,
-    "poweroff_machine": operations.PoweroffMachine,
-    "reboot_machine": operations.RebootMachine
-}
-"""Dictionary of method names and corresponding :class:`~ncclient.operations.RPC` subclasses. It is used to lookup operations, e.g. `get_config` is mapped to :class:`~ncclient.operations.GetConfig`. It is thus possible to add additional operations to the :class:`Manager` API."""
+class _Operations(dict):
+
+    # values given as the names of classes in ncclient.operations are looked
+    # up there, importing their module, when first used
+
+    def __getitem__(self, name):
+        op = dict.__getitem__(self, name)
+        if isinstance(op, basestring):
+            op = getattr(operations, op)
+        return op
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def itervalues(self):
+        return (self[name] for name in self)
+
+    def iteritems(self):
+        return ((name, self[name]) for name in self)
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+OPERATIONS = _Operations({
+    "get": "Get",
+    "get_config": "GetConfig",
+    "dispatch": "Dispatch",
+    "edit_config": "EditConfig",
+    "copy_config": "CopyConfig",
+    "validate": "Validate",
+    "commit": "Commit",
+    "discard_changes": "DiscardChanges",
+    "delete_config": "DeleteConfig",
+    "lock": "Lock",
+    "unlock": "Unlock",
+    "close_session": "CloseSession",
+    "kill_session": "KillSession",
+    "poweroff_machine": "PoweroffMachine",
+    "reboot_machine": "RebootMachine"
+})
+"""Dictionary of method names and corresponding :class:`~ncclient.operations.RPC` subclasses. It is used to lookup operations, e.g. `get_config` is mapped to :class:`~ncclient.operations.GetConfig`. It is thus possible to add additional operations to the :class:`Manager` API. A class may also be given by its name in :mod:`ncclient.operations`, which is only imported when the operation is first used."""
+
+def _set_reactor(session, reactor):
+    if reactor is True:
+        reactor = transport.shared_reactor()
+    session.reactor = reactor
 
 #def connect_ssh(*args, **kwds):
 #    """Initialize a :class:`Manager` over the SSH transport. For documentation of arguments see :meth:`ncclient.transport.SSHSession.connect`.
@@ -65,32 +96,76 @@ OPERATIONS = {
 #    The underlying :class:`ncclient.transport.SSHSession` is created with :data:`CAPABILITIES`. It is first instructed to :meth:`~ncclient.transport.SSHSession.load_known_hosts` and then  all the provided arguments are passed directly to its implementation of :meth:`~ncclient.transport.SSHSession.connect`.
 #    """
 #    session = transport.SSHSession(capabilities.Capabilities(CAPABILITIES))
+#    _set_reactor(session, kwds.pop('reactor', None))
 #    session.load_known_hosts()
 #    session.connect(*args, **kwds)
 #    return Manager(session)
 
 
 def connect_stdio(*args, **kwargs):
-    """Create a subprocess with a NETCONF server, takes
+    """Create a subprocess with a NETCONF server, takes the arguments of :meth:`ncclient.transport.StdIOSession.connect`.
+
+    *reactor* if specified is the :class:`~ncclient.transport.Reactor` to run the session's I/O, or `True` for :func:`~ncclient.transport.shared_reactor`; by default the session runs a thread of its own.
     """
     session = transport.StdIOSession(capabilities.Capabilities(CAPABILITIES))
+    _set_reactor(session, kwargs.pop('reactor', None))
+    session.connect(*args, **kwargs)
+    return Manager(session)
+
+def connect_loopback(*args, **kwargs):
+    """Initialize a :class:`Manager` over the in-process loopback transport. For documentation of arguments see :meth:`ncclient.transport.LoopbackSession.connect`; *reactor* is as for :func:`connect_stdio`.
+    """
+    session = transport.LoopbackSession(capabilities.Capabilities(CAPABILITIES))
+    _set_reactor(session, kwargs.pop('reactor', None))
     session.connect(*args, **kwargs)
     return Manager(session)
 
+def connect_resilient(factory, *args, **kwargs):
+    """Initialize a :class:`Manager` over a :class:`~ncclient.transport.ResilientSession`, which reconnects when the transport is lost. *factory* is called to connect, initially and after a loss, and may return either a :class:`Manager` (e.g. a call to one of the other factory functions) or a connected :class:`~ncclient.transport.Session`. For documentation of the other arguments see :class:`~ncclient.transport.ResilientSession`.
+
+    Example::
+
+        m = connect_resilient(lambda: connect_stdio(path), retries=10)
+    """
+    def connect_session():
+        session = factory()
+        if isinstance(session, Manager):
+            session = session._session
+        return session
+    session = transport.ResilientSession(connect_session, *args, **kwargs)
+    session.connect()
+    return Manager(session)
+
 connect = connect_stdio
 "Same as :func:`connect_stdio`, since StdIO is the default transport (for now)."
 
 
+class _Operation(object):
+
+    # the Manager method for OPERATIONS[name], which looks the operation up
+    # when first used rather than when the class is created
+
+    def __init__(self, name):
+        self._name = name
+
+    def __get__(self, manager, owner):
+        if manager is None:
+            return self
+        op_cls = OPERATIONS[self._name]
+        def wrapper(*args, **kwds):
+            return manager.execute(op_cls, *args, **kwds)
+        wrapper.func_name = self._name
+        wrapper.func_doc = op_cls.request.func_doc
+        return wrapper
+
+    __doc__ = property(lambda self: OPERATIONS[self._name].request.func_doc)
+
+
 class OpExecutor(type):
 
     def __new__(cls, name, bases, attrs):
-        def make_wrapper(op_cls):
-            def wrapper(self, *args, **kwds):
-                return self.execute(op_cls, *args, **kwds)
-            wrapper.func_doc = op_cls.request.func_doc
-            return wrapper
-        for op_name, op_cls in OPERATIONS.iteritems():
-            attrs[op_name] = make_wrapper(op_cls)
+        for op_name in OPERATIONS:
+            attrs[op_name] = _Operation(op_name)
         return super(OpExecutor, cls).__new__(cls, name, bases, attrs)
 
 class Manager(object):
@@ -168,6 +243,16 @@ class Manager(object):
         ":class:`~ncclient.capabilities.Capabilities` object representing the server's capabilities."
         return self._session._server_capabilities
 
+    @property
+    def supported_operations(self):
+        """Dictionary of the names of the :data:`OPERATIONS` the server has the capabilities for, each with the list of its :attr:`~ncclient.operations.RPC.OPTIONS` it has them for too. Imports all the operations."""
+        capabilities = self._session.server_capabilities
+        supported = {}
+        for name, op_cls in OPERATIONS.iteritems():
+            if capabilities.missing(op_cls.DEPENDS) is None:
+                supported[name] = sorted(option for option, cap in op_cls.OPTIONS.iteritems() if cap in capabilities)
+        return supported
+
     @property
     def session_id(self):
         "`session-id` assigned by the NETCONF server."
@@ -178,6 +263,11 @@ class Manager(object):
         "Whether currently connected to the NETCONF server."
         return self._session.connected
 
+    @property
+    def metrics(self):
+        ":class:`~ncclient.metrics.SessionMetrics` of the underlying session."
+        return self._session.metrics
+
     async_mode = property(fget=lambda self: self._async_mode, fset=__set_async_mode)
     "Specify whether operations are executed asynchronously (`True`) or synchronously (`False`) (the default)."
 
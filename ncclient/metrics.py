@@ -0,0 +1,199 @@
+# Copyright 2009 Shikhar Bhushan
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"Performance counters kept for each session, and their export in the Prometheus text format."
+
+from bisect import bisect_left
+from threading import Lock
+
+#: Default latency buckets in seconds, upper bounds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+           2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+#: Connect phases in the order they happen. Transports record the ones they go through
+PHASES = ('dns', 'tcp', 'kex', 'hostkey', 'auth', 'channel', 'spawn', 'hello')
+
+class Histogram(object):
+
+    "Cumulative histogram of observed values, e.g. latencies in seconds. *buckets* are the sorted upper bounds."
+
+    def __init__(self, buckets=BUCKETS):
+        self._buckets = tuple(buckets)
+        self._counts = [0] * (len(self._buckets) + 1) # last one is +Inf
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value):
+        "Adds a single observation."
+        self._counts[bisect_left(self._buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    @property
+    def buckets(self):
+        "List of *(upper bound, cumulative count)* tuples, the last upper bound being `float('inf')`."
+        total, result = 0, []
+        for bound, n in zip(self._buckets + (float('inf'),), self._counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+    @property
+    def sum(self):
+        "Sum of all observations."
+        return self._sum
+
+    @property
+    def count(self):
+        "Number of observations."
+        return self._count
+
+
+class SessionMetrics(object):
+
+    """Counters of a :class:`~ncclient.transport.Session`, available as its :attr:`~ncclient.transport.Session.metrics` attribute.
+
+    The byte and frame counters are only ever updated from the session's own thread, the RPC bookkeeping is guarded by a lock as requests are made from any thread."""
+
+    def __init__(self, session):
+        self._session = session
+        self._lock = Lock()
+        self.bytes_in = 0
+        "Bytes read from the transport, including framing."
+        self.bytes_out = 0
+        "Bytes written to the transport, including framing."
+        self.messages_in = 0
+        "Complete NETCONF messages received."
+        self.messages_out = 0
+        "NETCONF messages written."
+        self.frames_in = 0
+        "Frames decoded, i.e. chunks for base:1.1 and messages for base:1.0 framing."
+        self.bytes_moved = 0
+        "Bytes moved within or between message buffers after being read into one, e.g. to close the gap left by a base:1.1 chunk header."
+        self.connect_duration = None
+        "Seconds spent connecting, including the hello exchange, or `None`."
+        self.hello_duration = None
+        "Seconds spent in the hello exchange, or `None`."
+        self.reconnects = 0
+        "Times the transport was replaced, see :class:`~ncclient.transport.ResilientSession`."
+        self.connect_phases = {}
+        "Seconds spent in each phase of connecting that was reached, by name. See :data:`PHASES`."
+        self._in_flight = 0
+        self._rpc_latency = {}
+
+    def rpc_sent(self):
+        "Called when an RPC request has been queued."
+        with self._lock:
+            self._in_flight += 1
+
+    def rpc_done(self, operation, latency=None):
+        "Called when the RPC named *operation* completed. *latency* in seconds is recorded, unless it is `None` (i.e. no reply was received)."
+        with self._lock:
+            self._in_flight -= 1
+            if latency is not None:
+                hist = self._rpc_latency.get(operation)
+                if hist is None:
+                    hist = self._rpc_latency[operation] = Histogram()
+                hist.observe(latency)
+
+    @property
+    def queue_depth(self):
+        "Number of messages waiting in the send queue."
+        return self._session._q.qsize()
+
+    @property
+    def in_flight(self):
+        "Number of RPC's awaiting a reply."
+        return self._in_flight
+
+    @property
+    def rpc_latency(self):
+        "Dictionary of operation names (e.g. `'GetConfig'`) and their latency :class:`Histogram`."
+        with self._lock:
+            return dict(self._rpc_latency)
+
+    def snapshot(self):
+        "Returns a dictionary with the current value of all counters."
+        return {
+            'session_id': self._session.id,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'messages_in': self.messages_in,
+            'messages_out': self.messages_out,
+            'frames_in': self.frames_in,
+            'bytes_moved': self.bytes_moved,
+            'reconnects': self.reconnects,
+            'queue_depth': self.queue_depth,
+            'in_flight': self.in_flight,
+            'connect_duration': self.connect_duration,
+            'hello_duration': self.hello_duration,
+            'connect_phases': dict(self.connect_phases),
+            'rpc_latency': dict((op, {'buckets': h.buckets, 'sum': h.sum, 'count': h.count})
+                                for op, h in self.rpc_latency.iteritems()),
+        }
+
+
+_COUNTERS = [
+    ('bytes_in', 'counter', 'Bytes read from the transport'),
+    ('bytes_out', 'counter', 'Bytes written to the transport'),
+    ('messages_in', 'counter', 'NETCONF messages received'),
+    ('messages_out', 'counter', 'NETCONF messages sent'),
+    ('frames_in', 'counter', 'Frames decoded'),
+    ('bytes_moved', 'counter', 'Bytes received moved again after being read'),
+    ('reconnects', 'counter', 'Transports replaced after being lost'),
+    ('queue_depth', 'gauge', 'Messages waiting in the send queue'),
+    ('in_flight', 'gauge', 'RPCs awaiting a reply'),
+    ('connect_duration', 'gauge', 'Seconds spent connecting'),
+    ('hello_duration', 'gauge', 'Seconds spent in the hello exchange'),
+]
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                    for k, v in sorted(labels.items()))
+
+def _value(v):
+    if isinstance(v, (int, long)):
+        return str(v)
+    return repr(float(v)) if v != float('inf') else '+Inf'
+
+def prometheus_text(metrics, prefix='ncclient'):
+    "Renders the sequence of :class:`SessionMetrics` *metrics* in the Prometheus text exposition format, labelled by `session_id`."
+    snapshots = [m.snapshot() for m in metrics]
+    lines = []
+    for name, type, help in _COUNTERS:
+        metric = '%s_%s%s' % (prefix, name, '_total' if type == 'counter' else '')
+        lines.append('# HELP %s %s' % (metric, help))
+        lines.append('# TYPE %s %s' % (metric, type))
+        for snap in snapshots:
+            if snap[name] is not None:
+                lines.append('%s{%s} %s' % (metric, _labels(session_id=snap['session_id']), _value(snap[name])))
+    metric = '%s_connect_phase_seconds' % prefix
+    lines.append('# HELP %s Seconds spent in each connect phase' % metric)
+    lines.append('# TYPE %s gauge' % metric)
+    for snap in snapshots:
+        for phase in PHASES:
+            if phase in snap['connect_phases']:
+                lines.append('%s{%s} %s' % (metric, _labels(session_id=snap['session_id'], phase=phase), _value(snap['connect_phases'][phase])))
+    metric = '%s_rpc_latency_seconds' % prefix
+    lines.append('# HELP %s RPC round-trip latency' % metric)
+    lines.append('# TYPE %s histogram' % metric)
+    for snap in snapshots:
+        for op, hist in sorted(snap['rpc_latency'].items()):
+            for bound, n in hist['buckets']:
+                lines.append('%s_bucket{%s} %d' % (metric, _labels(session_id=snap['session_id'], operation=op, le=_value(bound)), n))
+            labels = _labels(session_id=snap['session_id'], operation=op)
+            lines.append('%s_sum{%s} %s' % (metric, labels, _value(hist['sum'])))
+            lines.append('%s_count{%s} %d' % (metric, labels, hist['count']))
+    return '\n'.join(lines) + '\n'
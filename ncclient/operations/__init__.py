@@ -12,16 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from errors import OperationError, TimeoutExpiredError, MissingCapabilityError
-from rpc import RPC, RPCReply, RPCError, RaiseMode
+"The operations are imported when first used, e.g. as `ncclient.operations.GetConfig`, rather than along with the package."
+
+import sys
 
-# rfc4741 ops
-from retrieve import Get, GetConfig, GetReply, Dispatch
-from edit import EditConfig, CopyConfig, DeleteConfig, Validate, Commit, DiscardChanges
-from session import CloseSession, KillSession
-from lock import Lock, Unlock, LockContext
-# others...
-from flowmon import PoweroffMachine, RebootMachine
+from ncclient.lazy import LazyModule
+
+from errors import OperationError, TimeoutExpiredError, MissingCapabilityError
 
 __all__ = [
     'RPC',
@@ -49,3 +46,30 @@ __all__ = [
     'TimeoutExpiredError',
     'MissingCapabilityError'
 ]
+
+sys.modules[__name__] = LazyModule(sys.modules[__name__], {
+    'RPC': 'rpc',
+    'RPCReply': 'rpc',
+    'RPCError': 'rpc',
+    'RaiseMode': 'rpc',
+    'RPCReplyListener': 'rpc', # internal use
+    # rfc4741 ops
+    'Get': 'retrieve',
+    'GetConfig': 'retrieve',
+    'GetReply': 'retrieve',
+    'Dispatch': 'retrieve',
+    'EditConfig': 'edit',
+    'CopyConfig': 'edit',
+    'DeleteConfig': 'edit',
+    'Validate': 'edit',
+    'Commit': 'edit',
+    'DiscardChanges': 'edit',
+    'CloseSession': 'session',
+    'KillSession': 'session',
+    'Lock': 'lock',
+    'Unlock': 'lock',
+    'LockContext': 'lock',
+    # others...
+    'PoweroffMachine': 'flowmon',
+    'RebootMachine': 'flowmon',
+})
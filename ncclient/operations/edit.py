@@ -27,12 +27,14 @@ logger = logging.getLogger("ncclient.operations.edit")
 class EditConfig(RPC):
     "`edit-config` RPC"
 
+    OPTIONS = {'url': ':url', 'error_option': ':rollback-on-error', 'test_option': ':validate'}
+
     def request(self, target, config, default_operation=None, test_option=None, error_option=None):
         """Loads all or part of the specified *config* to the *target* configuration datastore.
 
         *target* is the name of the configuration datastore being edited
 
-        *config* is the configuration, which must be rooted in the `config` element. It can be specified either as a string or an :class:`~xml.etree.ElementTree.Element`.
+        *config* is the configuration, which must be rooted in the `config` element. It can be specified either as a string or an :class:`~xml.etree.ElementTree.Element`, or to be streamed onto the wire without being parsed or held in memory, as the name of a file, a file-like object or an iterable of strings, unicode being sent as UTF-8 (see :func:`~ncclient.operations.util.config_stream`).
 
         *default_operation* if specified must be one of { `"merge"`, `"replace"`, or `"none"` }
 
@@ -54,6 +56,9 @@ class EditConfig(RPC):
         if default_operation is not None:
         # TODO: check if it is a valid default-operation
             sub_ele(node, "default-operation").text = default_operation
+        stream = util.config_stream(config)
+        if stream is not None:
+            return self._request(self._wrap_stream(node, sub_ele(node, "config"), stream))
         node.append(validated_element(config, ("config", qualify("config"))))
         return self._request(node)
 
@@ -61,6 +66,8 @@ class EditConfig(RPC):
 class DeleteConfig(RPC):
     "`delete-config` RPC"
 
+    OPTIONS = {'url': ':url'}
+
     def request(self, target):
         """Delete a configuration datastore.
 
@@ -75,17 +82,24 @@ class DeleteConfig(RPC):
 class CopyConfig(RPC):
     "`copy-config` RPC"
 
+    OPTIONS = {'url': ':url'}
+
     def request(self, source, target):
         """Create or replace an entire configuration datastore with the contents of another complete
         configuration datastore.
 
-        *source* is the name of the configuration datastore to use as the source of the copy operation or `config` element containing the configuration subtree to copy
+        *source* is the name of the configuration datastore to use as the source of the copy operation or `config` element containing the configuration subtree to copy. The latter can also be streamed from a file-like object or an iterable of strings, as with :meth:`EditConfig.request`.
 
         *target* is the name of the configuration datastore to use as the destination of the copy operation
 
         :seealso: :ref:`srctarget_params`"""
         node = new_ele("copy-config")
         node.append(util.datastore_or_url("target", target, self._assert))
+        # a name would be that of a datastore, not of a file
+        stream = util.config_stream(source, path=False)
+        if stream is not None:
+            src = sub_ele(node, "source")
+            return self._request(self._wrap_stream(node, sub_ele(src, "config"), stream))
         node.append(util.datastore_or_url("source", source, self._assert))
         return self._request(node)
 
@@ -95,6 +109,8 @@ class Validate(RPC):
 
     DEPENDS = [':validate']
 
+    OPTIONS = {'url': ':url'}
+
     def request(self, source):
         """Validate the contents of the specified configuration.
 
@@ -116,6 +132,8 @@ class Commit(RPC):
 
     DEPENDS = [':candidate']
 
+    OPTIONS = {'confirmed': ':confirmed-commit'}
+
     def request(self, confirmed=False, timeout=None):
         """Commit the candidate configuration as the device's new current configuration. Depends on the `:candidate` capability.
 
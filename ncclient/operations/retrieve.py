@@ -18,28 +18,49 @@ from ncclient.xml_ import *
 
 import util
 
+# what data_xml starts with, whether sliced from the reply or serialized
+_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>'
+
+def _without_declaration(xml):
+    if xml.startswith('<?xml'):
+        return xml[xml.index('?>') + 2:].lstrip()
+    return xml
+
+# GetReply._data until the reply has been looked at, as it may have no data
+_UNPARSED = object()
+
 class GetReply(RPCReply):
 
-    """Adds attributes for the *data* element to `RPCReply`."""
+    """Adds attributes for the *data* element to `RPCReply`. The reply is only parsed into a tree once :attr:`data_ele` is asked for."""
+
+    _data = _UNPARSED
 
-    def _parsing_hook(self, root):
-        self._data = None
-        if not self._errors:
-            self._data = root.find(qualify("data"))
-    
     @property
     def data_ele(self):
-        "*data* element as an :class:`~xml.etree.ElementTree.Element`"
-        if not self._parsed:
-            self.parse()
+        "*data* element as an :class:`~xml.etree.ElementTree.Element`, or `None` if the reply has errors or no *data* element"
+        if self._data is _UNPARSED:
+            self._data = self._tree().find(qualify("data")) if self.ok else None
         return self._data
 
     @property
     def data_xml(self):
-        "*data* element as an XML string"
-        if not self._parsed:
-            self.parse()
-        return to_xml(self._data)
+        """*data* element as an XML string, starting with an XML declaration. Where possible it is sliced from the reply as received (see :func:`~ncclient.xml_.element_xml`), without building its tree; otherwise the parsed element is serialized. Either way the reply is first checked for errors, as by :meth:`parse`. `None` if the reply has errors or no *data* element, like :attr:`data_ele`."""
+        xml = element_xml(self._raw, qualify("data")) if self.ok else None
+        if xml is None:
+            data = self.data_ele
+            if data is None:
+                return None
+            xml = _without_declaration(to_xml(data))
+        return _DECLARATION + xml
+
+    @property
+    def data_view(self):
+        """A read-only :class:`buffer` of the *data* element in the reply as received, without copying or parsing it, or `None` if it cannot be located that way or the reply has errors. Unlike :attr:`data_xml` it has no XML declaration, and lacks the namespace declarations inherited from the `rpc-reply` element, commonly that of the NETCONF base namespace."""
+        if not self.ok:
+            return None
+        span = element_span(self._raw, qualify("data"))
+        if span is not None:
+            return buffer(self._raw, span[0], span[1] - span[0])
     
     data = data_ele
     "Same as :attr:`data_ele`"
@@ -52,6 +73,8 @@ class Get(RPC):
     REPLY_CLS = GetReply
     "See :class:`GetReply`."
 
+    IDEMPOTENT = True
+
     def request(self, filter=None):
         """Retrieve running configuration and device state information.
 
@@ -72,6 +95,10 @@ class GetConfig(RPC):
     REPLY_CLS = GetReply
     "See :class:`GetReply`."
 
+    IDEMPOTENT = True
+
+    OPTIONS = {'url': ':url'}
+
     def request(self, source, filter=None):
         """Retrieve all or part of a specified configuration.
 
@@ -93,7 +120,9 @@ class Dispatch(RPC):
     REPLY_CLS = GetReply
     "See :class:`GetReply`."
 
-    def request(self, rpc_command, source=None, filter=None):
+    OPTIONS = {'url': ':url'}
+
+    def request(self, rpc_command, source=None, filter=None, idempotent=False):
         """
         *rpc_command* specifies rpc command to be dispatched either in plain text or in xml element format (depending on command)
 
@@ -101,6 +130,8 @@ class Dispatch(RPC):
 
         *filter* specifies the portion of the configuration to retrieve (by default entire configuration is retrieved)
 
+        *idempotent* marks the command as safe to send again after a reconnect, see :attr:`~ncclient.operations.RPC.idempotent`
+
         :seealso: :ref:`filter_params`
 
         Examples of usage::
@@ -115,7 +146,7 @@ class Dispatch(RPC):
         dispatch(xsd_fetch)
         """
 
-        if ET.iselement(rpc_command):
+        if iselement(rpc_command):
             node = rpc_command
         else:
             node = new_ele(rpc_command)
@@ -123,5 +154,6 @@ class Dispatch(RPC):
             node.append(util.datastore_or_url("source", source, self._assert))
         if filter is not None:
             node.append(util.build_filter(filter))
+        self._idempotent = idempotent
         return self._request(node)
 
@@ -12,11 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
 from threading import Event, Lock
 from uuid import uuid1
 
 from ncclient.xml_ import *
-from ncclient.transport import SessionListener
+from ncclient.transport import SessionListener, MessageStream
 
 from errors import OperationError, TimeoutExpiredError, MissingCapabilityError
 
@@ -89,6 +90,11 @@ class RPCError(OperationError):
         return self._info
 
 
+# the top-level elements of a reply which parse() tells apart without
+# parsing the whole reply
+_OK, _DATA, _RPC_ERROR = qualify("ok"), qualify("data"), qualify("rpc-error")
+
+
 class RPCReply:
 
     """Represents an *rpc-reply*. Only concerns itself with whether the operation was successful.
@@ -103,37 +109,65 @@ class RPCReply:
     
     def __init__(self, raw):
         self._raw = raw
+        self._xml = None # see xml
         self._parsed = False
         self._root = None
         self._errors = []
 
     def __repr__(self):
-        return self._raw
+        return self.xml
     
     def parse(self):
-        "Parses the *rpc-reply*."
+        """Parses the *rpc-reply*. As long as its top-level elements are all `ok`, `data` or `rpc-error`, they are told apart without parsing the reply, only `rpc-error` elements being parsed. The tree of the whole reply is built otherwise, if :meth:`_parsing_hook` is overridden, or once something needs it."""
         if self._parsed: return
-        root = self._root = to_ele(self._raw) # The <rpc-reply> element
-        # Per RFC 4741 an <ok/> tag is sent when there are no errors or warnings
-        ok = root.find(qualify("ok"))
-        if ok is None:
-            # Create RPCError objects from <rpc-error> elements
-            error = root.find(qualify("rpc-error"))
-            if error is not None:
-                for err in root.getiterator(error.tag):
-                    # Process a particular <rpc-error>
-                    self._errors.append(self.ERROR_CLS(err))
-        self._parsing_hook(root)
+        errors = self._top_level_errors()
+        if errors is None or self._parsing_hook.im_func is not RPCReply._parsing_hook.im_func:
+            root = self._tree()
+            if errors is None:
+                errors = []
+                # Per RFC 4741 an <ok/> tag is sent when there are no errors or warnings
+                ok = root.find(_OK)
+                if ok is None:
+                    # Create RPCError objects from <rpc-error> elements
+                    error = root.find(_RPC_ERROR)
+                    if error is not None:
+                        errors = root.getiterator(error.tag)
+            self._parsing_hook(root)
+        for err in errors:
+            # Process a particular <rpc-error>
+            self._errors.append(self.ERROR_CLS(err))
         self._parsed = True
 
+    def _top_level_errors(self):
+        # the <rpc-error> elements, or None if the reply has other top-level
+        # elements than those we know, or is not laid out as expected
+        errors = []
+        try:
+            for tag, start, end, namespaces in root_children(self._raw, (_DATA,)):
+                if tag == _RPC_ERROR:
+                    errors.append(to_ele(detached(self._raw, start, end, namespaces)))
+                elif tag != _OK and tag != _DATA:
+                    return None
+        except ValueError:
+            return None
+        return errors
+
+    def _tree(self):
+        "The *rpc-reply* element, parsed on first use."
+        if self._root is None:
+            self._root = to_ele(self._raw)
+        return self._root
+
     def _parsing_hook(self, root):
-        "No-op by default. Gets passed the *root* element for the reply."
+        "No-op by default. Gets passed the *root* element for the reply; overriding it has :meth:`parse` build the tree of the reply."
         pass
     
     @property
     def xml(self):
-        "*rpc-reply* element as returned."
-        return self._raw
+        "*rpc-reply* element as returned, as a string. The reply is kept as a read-only :class:`buffer` of what it was received into, the string is made of it on first use."
+        if self._xml is None:
+            self._xml = str(self._raw)
+        return self._xml
     
     @property
     def ok(self):
@@ -157,20 +191,31 @@ class RPCReply:
 
 
 class RPCReplyListener(SessionListener): # internal use
-    
+
+    # routes the replies of a session to its RPC's; there is one per session,
+    # kept as its _reply_listener, see for_session()
+
+    RAW_BUFFER = True # replies are kept as received
+
     creation_lock = Lock()
-    
-    # one instance per session -- maybe there is a better way??
-    def __new__(cls, session):
-        with RPCReplyListener.creation_lock:
-            instance = session.get_listener_instance(cls)
-            if instance is None:
-                instance = object.__new__(cls)
-                instance._lock = Lock()
-                instance._id2rpc = {}
-                #instance._pipelined = session.can_pipeline
-                session.add_listener(instance)
-            return instance
+
+    def __init__(self):
+        self._lock = Lock()
+        self._id2rpc = {}
+
+    @classmethod
+    def for_session(cls, session):
+        "Returns the listener of *session*, installing it if it has none yet."
+        listener = session._reply_listener
+        if listener is None:
+            # only ever taken once per session
+            with cls.creation_lock:
+                listener = session._reply_listener
+                if listener is None:
+                    listener = cls()
+                    session.add_listener(listener)
+                    session._reply_listener = listener
+        return listener
 
     def register(self, id, rpc):
         with self._lock:
@@ -186,7 +231,7 @@ class RPCReplyListener(SessionListener): # internal use
                 with self._lock:
                     try:
                         rpc = self._id2rpc[id] # the corresponding rpc
-                        logger.debug("Delivering to %r" % rpc)
+                        logger.debug("Delivering to %r", rpc)
                         rpc.deliver_reply(raw)
                     except KeyError:
                         raise OperationError("Unknown 'message-id': %s", id)
@@ -205,6 +250,18 @@ class RPCReplyListener(SessionListener): # internal use
         finally:
             self._id2rpc.clear()
 
+    def reconnecting(self, err):
+        # only what is safe to repeat may be sent again, fail the rest
+        failed = []
+        with self._lock:
+            for id, rpc in self._id2rpc.items():
+                if not rpc.idempotent:
+                    del self._id2rpc[id]
+                    failed.append(rpc)
+        for rpc in failed:
+            rpc.deliver_error(err)
+        return [rpc.id for rpc in failed]
+
 
 class RaiseMode(object):
 
@@ -223,10 +280,16 @@ class RPC(object):
     """Base class for all operations, directly corresponding to *rpc* requests. Handles making the request, and taking delivery of the reply."""
 
     DEPENDS = []
-    """Subclasses can specify their dependencies on capabilities as a list of URI's or abbreviated names, e.g. ':writable-running'. These are verified at the time of instantiation. If the capability is not available, :exc:`MissingCapabilityError` is raised."""
+    """Subclasses can specify their dependencies on capabilities as a list of URI's or abbreviated names, e.g. ':writable-running'. These are verified at the time of instantiation, once per session and list (see :meth:`~ncclient.capabilities.Capabilities.missing`). If the capability is not available, :exc:`MissingCapabilityError` is raised."""
+
+    OPTIONS = {}
+    """Subclasses can specify which of their options depend on further capabilities, as a dictionary of option names and the URI or abbreviated name of the capability each depends on, e.g. `{'confirmed': ':confirmed-commit'}`. Options are named by their argument, or `url` for a URL given as source or target; an option may need the capability for some of its values only, as `error_option` does for `rollback-on-error`. These are verified when the option is used, see :meth:`_assert`, and reported by :attr:`Manager.supported_operations <ncclient.manager.Manager.supported_operations>`."""
     
     REPLY_CLS = RPCReply
     "By default :class:`RPCReply`. Subclasses can specify a :class:`RPCReply` subclass."
+
+    IDEMPOTENT = False
+    "Subclasses set this to `True` if requesting them twice has the same effect as requesting them once, see :attr:`idempotent`."
     
     def __init__(self, session, async=False, timeout=30, raise_mode=RaiseMode.NONE):
         """
@@ -239,20 +302,26 @@ class RPC(object):
         *raise_mode* specifies the exception raising mode, see :attr:`raise_mode`
         """
         self._session = session
-        try:
-            for cap in self.DEPENDS:
-                self._assert(cap)
-        except AttributeError:
-            pass
+        if self.DEPENDS:
+            try:
+                missing = session.server_capabilities.missing(self.DEPENDS)
+            except AttributeError:
+                pass
+            else:
+                if missing is not None:
+                    raise MissingCapabilityError('Server does not support [%s]' % missing)
         self._async = async
         self._timeout = timeout
         self._raise_mode = raise_mode
         self._id = uuid1().urn # Keeps things simple instead of having a class attr with running ID that has to be locked
-        self._listener = RPCReplyListener(session)
+        self._listener = RPCReplyListener.for_session(session)
         self._listener.register(self._id, self)
         self._reply = None
         self._error = None
         self._event = Event()
+        self._sent = None # time the request was queued, until accounted as done
+        self._sent_lock = Lock()
+        self._idempotent = self.IDEMPOTENT
     
     def _wrap(self, subele):
         # internal use
@@ -260,6 +329,16 @@ class RPC(object):
         ele.append(subele)
         return to_xml(ele)
 
+    def _wrap_stream(self, subele, placeholder, body):
+        """Implementations of :meth:`request` streaming part of the request call this method to obtain the request for :meth:`_request`, as a :class:`~ncclient.transport.MessageStream`. *body*, an iterable of strings which is not parsed, takes the place of the *placeholder* element within *subele*."""
+        marker = uuid1().hex
+        placeholder.text = marker
+        raw = self._wrap(subele)
+        pos = raw.index(marker)
+        head = raw[:raw.rindex('<', 0, pos)]
+        tail = raw[raw.index('>', pos) + 1:]
+        return MessageStream(head, body, tail)
+
     def _request(self, op):
         """Implementations of :meth:`request` call this method to send the request and process the reply.
         
@@ -267,16 +346,23 @@ class RPC(object):
         
         In asynchronous mode, returns immediately, returning `self`. The :attr:`event` attribute will be set when the reply has been received (see :attr:`reply`) or an error occured (see :attr:`error`).
         
-        *op* is the operation to be requested as an :class:`~xml.etree.ElementTree.Element`
+        *op* is the operation to be requested as an :class:`~xml.etree.ElementTree.Element`, or the whole request as a :class:`~ncclient.transport.MessageStream` (see :meth:`_wrap_stream`)
         """
-        logger.info('Requesting %r' % self.__class__.__name__)
-        req = self._wrap(op)
-        self._session.send(req)
+        logger.info('Requesting %r', self.__class__.__name__)
+        req = op if isinstance(op, MessageStream) else self._wrap(op)
+        # accounted before sending, the reply may well beat us to it
+        self._sent = time.time()
+        self._session.metrics.rpc_sent()
+        try:
+            self._session.send(req)
+        except Exception:
+            self._done(False)
+            raise
         if self._async:
             logger.debug('Async request, returning %r', self)
             return self
         else:
-            logger.debug('Sync request, will wait for timeout=%r' % self._timeout)
+            logger.debug('Sync request, will wait for timeout=%r', self._timeout)
             self._event.wait(self._timeout / 2.0)
             if not self._event.isSet():
                 self._event.wait(self._timeout / 2.0)
@@ -293,6 +379,8 @@ class RPC(object):
                         raise self._reply.error
                 return self._reply
             else:
+                # given up on, a late reply is not to count
+                self._done(False)
                 raise TimeoutExpiredError
 
     def request(self):
@@ -304,18 +392,29 @@ class RPC(object):
     def _assert(self, capability):
         """Subclasses can use this method to verify that a capability is available with the NETCONF
         server, before making a request that requires it. A :exc:`MissingCapabilityError` will be
-        raised if the capability is not available."""
+        raised if the capability is not available. The check is a single lookup."""
         if capability not in self._session.server_capabilities:
             raise MissingCapabilityError('Server does not support [%s]' % capability)
     
+    def _done(self, replied):
+        # accounts for the request in the metrics, only once, whichever of
+        # the reply, an error or the timeout comes first
+        with self._sent_lock:
+            sent, self._sent = self._sent, None
+        if sent is not None:
+            latency = time.time() - sent if replied else None
+            self._session.metrics.rpc_done(self.__class__.__name__, latency)
+
     def deliver_reply(self, raw):
         # internal use
         self._reply = self.REPLY_CLS(raw)
+        self._done(True)
         self._event.set()
 
     def deliver_error(self, err):
         # internal use
         self._error = err
+        self._done(False)
         self._event.set()
     
     @property
@@ -343,6 +442,11 @@ class RPC(object):
         "The `~ncclient.transport.Session` object associated with this RPC."
         return self._session
 
+    @property
+    def idempotent(self):
+        """Whether the request may safely be sent again, by default :attr:`IDEMPOTENT`. A :class:`~ncclient.transport.ResilientSession` that lost its transport resends unanswered idempotent requests, and fails the others."""
+        return self._idempotent
+
     @property
     def event(self):
         """:class:`~threading.Event` that is set when reply has been received or when an error preventing
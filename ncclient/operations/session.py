@@ -24,6 +24,7 @@ class CloseSession(RPC):
 
     def request(self):
         "Request graceful termination of the NETCONF session, and also close the transport."
+        self.session.expect_close(self.id)
         try:
             return self._request(new_ele("close-session"))
         finally:
@@ -14,6 +14,9 @@
 
 'Boilerplate ugliness'
 
+import re
+import itertools
+
 from ncclient.xml_ import *
 
 from errors import OperationError, MissingCapabilityError
@@ -29,6 +32,57 @@ def one_of(*args):
                 return
     raise OperationError("Insufficient parameters")
 
+#: Bytes read at a time from a configuration file being streamed
+READ_SIZE = 1 << 20
+
+# bytes at most looked at for the root element of a streamed document
+_HEAD_SIZE = 1 << 16
+
+# the XML declaration, comments, and the start of the root element
+_ROOT_RE = re.compile(r'\s*(?:<\?xml.*?\?>\s*)?(?:<!--.*?-->\s*)*(<(?:[\w.-]+:)?([\w.-]+))[\s/>]', re.S)
+
+def _read_blocks(f, close):
+    try:
+        while True:
+            block = f.read(READ_SIZE)
+            if not block:
+                return
+            yield block
+    finally:
+        if close:
+            f.close()
+
+def _utf8(blocks):
+    for block in blocks:
+        if isinstance(block, unicode):
+            block = block.encode('utf-8')
+        yield block
+
+def config_stream(config, path=True):
+    """Returns an iterator over the blocks of *config* if it is to be streamed rather than parsed: a file-like object, an iterable of strings or, if *path* is `True`, the name of a file. Returns `None` for an XML string or an :class:`~xml.etree.ElementTree.Element`.
+
+    The blocks are byte strings, as sent: unicode blocks, e.g. from a file opened in text mode, are encoded to UTF-8. Only the start of the document is checked, for its root element to be `config`, and an XML declaration is dropped. Raises :exc:`~ncclient.xml_.XMLError` otherwise."""
+    if hasattr(config, 'tag'):
+        return None
+    if isinstance(config, basestring):
+        if not path or config.lstrip().startswith('<'):
+            return None
+        blocks = _read_blocks(open(config, 'rb'), True)
+    elif hasattr(config, 'read'):
+        blocks = _read_blocks(config, False)
+    else:
+        blocks = iter(config)
+    blocks = _utf8(blocks)
+    head, match = '', None
+    for block in blocks:
+        head += block
+        match = _ROOT_RE.match(head)
+        if match is not None or len(head) >= _HEAD_SIZE:
+            break
+    if match is None or match.group(2) != 'config':
+        raise XMLError("Streamed document is not rooted in [config]")
+    return itertools.chain([head[match.start(1):]], blocks)
+
 def datastore_or_url(wha, loc, capcheck=None):
     node = new_ele(wha)
     if "://" in loc: # e.g. http://, file://, ftp://
@@ -12,21 +12,49 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"Transport layer"
+"""Transport layer
+
+The transports are imported when first used, e.g. as `ncclient.transport.StdIOSession`, rather than along with the package."""
+
+import sys
+
+from ncclient.lazy import LazyModule
 
-from session import Session, SessionListener
-# from ssh import SSHSession
-from stdio import StdIOSession
 from errors import *
 
 __all__ = [
     'Session',
     'SessionListener',
+    'MessageStream',
 #    'SSHSession',
     'StdIOSession',
+    'LoopbackSession',
+    'LoopbackResponder',
+    'ResilientSession',
+    'Reactor',
+    'shared_reactor',
+    'WireTrace',
+    'TraceRecord',
     'TransportError',
     'AuthenticationError',
     'SessionCloseError',
+    'SessionTimeoutError',
+    'SessionDeadError',
     'SSHError',
     'SSHUnknownHostError'
-]
\ No newline at end of file
+]
+
+sys.modules[__name__] = LazyModule(sys.modules[__name__], {
+    'Session': 'session',
+    'SessionListener': 'session',
+    'MessageStream': 'session',
+#    'SSHSession': 'ssh',
+    'StdIOSession': 'stdio',
+    'LoopbackSession': 'loopback',
+    'LoopbackResponder': 'loopback',
+    'ResilientSession': 'resilient',
+    'Reactor': 'reactor',
+    'shared_reactor': 'reactor',
+    'WireTrace': 'trace',
+    'TraceRecord': 'trace',
+})
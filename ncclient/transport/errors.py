@@ -30,6 +30,19 @@ class SessionCloseError(TransportError):
             msg += ' OUT_BUFFER: `%s`' % out_buf
         SSHError.__init__(self, msg)
 
+class SessionTimeoutError(TransportError):
+
+    def __init__(self, phase, timeout):
+        TransportError.__init__(self, 'Timed out after %.3gs in connect phase [%s]' % (timeout, phase))
+        self.phase = phase
+        self.timeout = timeout
+
+class SessionDeadError(TransportError):
+
+    def __init__(self, timeout):
+        TransportError.__init__(self, 'No sign of life from the peer within %.3gs of a liveness check' % timeout)
+        self.timeout = timeout
+
 class SSHError(TransportError):
     pass
 
@@ -0,0 +1,239 @@
+# Copyright 2009 Shikhar Bhushan
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"Process-wide caches of SSH keys, shared by all :class:`~ncclient.transport.SSHSession` instances"
+
+import os
+import time
+from threading import Lock
+
+import paramiko
+
+import logging
+logger = logging.getLogger("ncclient.transport.keys")
+
+#: Key types tried for a private key file of unknown type
+KEY_CLASSES = (paramiko.RSAKey, paramiko.DSSKey)
+
+#: Seconds the list of agent keys is reused before the agent is asked again
+AGENT_TTL = 60
+
+
+def _stamp(filename):
+    st = os.stat(filename)
+    return (st.st_mtime, st.st_size)
+
+
+class PrivateKeyCache(object):
+
+    """Parsed private keys, so that a key file is decrypted and parsed once rather than on every connection. An entry is dropped as soon as the file's modification time or size changes. Failures are cached as well, so a key that cannot be loaded (e.g. it needs a passphrase) is not tried again until the file changes."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = {} # (filename, password, classes) -> (stamp, key or exception)
+
+    def load(self, filename, password=None, classes=KEY_CLASSES):
+        """Returns the private key in *filename*, decrypted with *password* if needed, trying each of the key *classes* in turn. Raises the last error if none of them can load it."""
+        stamp = _stamp(filename)
+        key = (filename, password, tuple(classes))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] != stamp:
+            result = None
+            for cls in classes:
+                try:
+                    result = cls.from_private_key_file(filename, password)
+                    break
+                except Exception as e:
+                    result = e
+            entry = (stamp, result)
+            with self._lock:
+                self._entries[key] = entry
+        if isinstance(entry[1], Exception):
+            raise entry[1]
+        return entry[1]
+
+    def clear(self):
+        "Drops all cached keys."
+        with self._lock:
+            self._entries.clear()
+
+
+class _AgentKey(object):
+
+    # The agent connection is shared, so requests to sign must not interleave.
+
+    def __init__(self, key, lock):
+        self._key = key
+        self._lock = lock
+
+    def sign_ssh_data(self, *args, **kwds):
+        with self._lock:
+            return self._key.sign_ssh_data(*args, **kwds)
+
+    def __getattr__(self, name):
+        return getattr(self._key, name)
+
+    def __str__(self):
+        return str(self._key)
+
+
+class AgentKeys(object):
+
+    """A single connection to the SSH agent and the keys it holds, reused across connections. The connection is reopened when :envvar:`SSH_AUTH_SOCK` changes, when the key list is older than :data:`AGENT_TTL` or after :meth:`reset`."""
+
+    def __init__(self, ttl=AGENT_TTL):
+        self._ttl = ttl
+        self._lock = Lock()
+        self._sign_lock = Lock()
+        self._agent = None
+        self._keys = []
+        self._sock = None
+        self._fetched = 0
+
+    def get_keys(self):
+        "Returns the agent's keys, empty if no agent is running."
+        sock = os.environ.get('SSH_AUTH_SOCK')
+        with self._lock:
+            if (self._agent is None or sock != self._sock
+                or time.time() - self._fetched > self._ttl):
+                # not closed, connections may still be signing with its keys
+                self._agent = paramiko.Agent()
+                self._keys = [_AgentKey(key, self._sign_lock) for key in self._agent.get_keys()]
+                self._sock = sock
+                self._fetched = time.time()
+            return list(self._keys)
+
+    def _reset(self):
+        if self._agent is not None:
+            with self._sign_lock:
+                self._agent.close()
+        self._agent = None
+        self._keys = []
+
+    def reset(self):
+        "Closes the agent connection, it is reopened on next use."
+        with self._lock:
+            self._reset()
+
+
+#: The :class:`PrivateKeyCache` used by :class:`~ncclient.transport.SSHSession`
+private_keys = PrivateKeyCache()
+
+#: The :class:`AgentKeys` used by :class:`~ncclient.transport.SSHSession`
+agent_keys = AgentKeys()
+
+
+class HostKeyStore(object):
+
+    """The host keys of an OpenSSH :file:`known_hosts` file, parsed once and shared by all sessions. The file is only read again when its modification time or size changes.
+
+    Plain entries are indexed by hostname. Hashed entries cannot be indexed, so the result of matching a hostname against them is remembered until the next reload. Keys accepted at runtime can be recorded with :meth:`add`, and are appended to the file in batches by :meth:`flush`.
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._lock = Lock()
+        self._stamp = None
+        self._plain = {} # hostname -> {keytype: key}
+        self._hashed = [] # (hashed hostname, keytype, key)
+        self._matched = {} # hostname -> {keytype: key}, for hashed entries
+        self._added = {} # hostname -> {keytype: key}, accepted at runtime
+        self._pending = [] # (hostname, key) not yet written
+        self._reload()
+
+    def _reload(self):
+        stamp = _stamp(self._filename)
+        if stamp == self._stamp:
+            return
+        plain, hashed = {}, []
+        with open(self._filename) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                entry = paramiko.hostkeys.HostKeyEntry.from_line(line)
+                if entry is None or entry.key is None:
+                    continue
+                keytype = entry.key.get_name()
+                for hostname in entry.hostnames:
+                    if hostname.startswith('|1|'):
+                        hashed.append((hostname, keytype, entry.key))
+                    else:
+                        plain.setdefault(hostname, {})[keytype] = entry.key
+        logger.debug("loaded %d plain and %d hashed host keys from %s",
+                     len(plain), len(hashed), self._filename)
+        self._plain, self._hashed, self._matched = plain, hashed, {}
+        self._stamp = stamp
+
+    def lookup(self, hostname):
+        "Returns a dictionary of key types and the keys known for *hostname*."
+        with self._lock:
+            try:
+                self._reload()
+            except (IOError, OSError) as e:
+                logger.debug("keeping host keys of %s: %r", self._filename, e)
+            found = self._matched.get(hostname)
+            if found is None:
+                found = {}
+                for hashed, keytype, key in self._hashed:
+                    if paramiko.HostKeys.hash_host(hostname, hashed) == hashed:
+                        found[keytype] = key
+                self._matched[hostname] = found
+            result = dict(found)
+            result.update(self._plain.get(hostname, {}))
+            result.update(self._added.get(hostname, {}))
+            return result
+
+    def check(self, hostname, key):
+        "Returns `True` if *key* is a known host key for *hostname*."
+        known = self.lookup(hostname).get(key.get_name())
+        return known is not None and known.get_base64() == key.get_base64()
+
+    def add(self, hostname, key):
+        "Records *key* as known for *hostname*, to be written out by the next :meth:`flush`."
+        with self._lock:
+            self._added.setdefault(hostname, {})[key.get_name()] = key
+            self._pending.append((hostname, key))
+
+    def flush(self):
+        "Appends the keys recorded with :meth:`add` to the file, in one write."
+        with self._lock:
+            if not self._pending:
+                return
+            lines = ['%s %s %s\n' % (hostname, key.get_name(), key.get_base64())
+                     for hostname, key in self._pending]
+            with open(self._filename, 'a') as f:
+                f.write(''.join(lines))
+            self._pending = []
+            # what we just wrote is already in memory
+            self._stamp = _stamp(self._filename)
+
+    @property
+    def filename(self):
+        "The :file:`known_hosts` file."
+        return self._filename
+
+
+_stores = {}
+_stores_lock = Lock()
+
+def known_hosts(filename):
+    "Returns the shared :class:`HostKeyStore` for *filename*, loading it on first use. Raises :exc:`IOError` if it cannot be read."
+    filename = os.path.abspath(os.path.expanduser(filename))
+    with _stores_lock:
+        store = _stores.get(filename)
+        if store is None:
+            store = _stores[filename] = HostKeyStore(filename)
+        return store
@@ -0,0 +1,295 @@
+# Copyright 2009 Shikhar Bhushan
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"In-process loopback transport, for testing and benchmarking without a NETCONF server"
+
+import os
+import re
+import time
+import heapq
+import errno
+import socket
+import select
+from threading import Thread, Lock
+
+from errors import SessionCloseError
+from session import Rfc4742Session, BASE_1_0, BASE_1_1
+
+import logging
+logger = logging.getLogger("ncclient.transport.loopback")
+
+BUF_SIZE = 65536
+
+MSG_DELIM = "]]>]]>"
+
+HELLO = """<?xml version="1.0" encoding="UTF-8"?>
+<hello xmlns="urn:ietf:params:xml:ns:netconf:base:1.0"><capabilities>%s</capabilities><session-id>%s</session-id></hello>"""
+
+REPLY = """<?xml version="1.0" encoding="UTF-8"?>
+<rpc-reply xmlns="urn:ietf:params:xml:ns:netconf:base:1.0" message-id="%s">%s</rpc-reply>"""
+
+# message-id and the operation, i.e. the first child of <rpc>
+_RPC_RE = re.compile(r'<(?:[\w.-]+:)?rpc\b[^>]*?message-id=["\']([^"\']*)["\'][^>]*>\s*<(?:[\w.-]+:)?([\w.-]+)')
+
+
+class LoopbackResponder(object):
+
+    """Server end of a :class:`LoopbackSession`. Scripting it is a matter of overriding :meth:`reply`.
+
+    *capabilities* is the list of capability URI's announced, by default base:1.0 and base:1.1
+
+    *data* is the content replied to `get` and `get-config`
+
+    *delay* is the number of seconds each reply is held back, to simulate device latency
+
+    *session_id* is the `session-id` sent in the server's hello
+    """
+
+    _ids = iter(xrange(1, 1 << 31))
+
+    def __init__(self, capabilities=None, data='<data/>', delay=0, session_id=None):
+        self.capabilities = capabilities or [BASE_1_0, BASE_1_1]
+        self.data = data
+        self.delay = delay
+        self.session_id = session_id if session_id is not None else self._ids.next()
+        self.chunked = False # until the client's hello says otherwise
+        self.closed = False
+        self._buf = ''
+
+    def reply(self, operation, message_id, raw):
+        "Returns the contents of the `rpc-reply` to the request *raw* for *operation* (e.g. `'get-config'`)."
+        return self.data if operation in ('get', 'get-config') else '<ok/>'
+
+    def hello(self):
+        "The framed hello message."
+        caps = ''.join(['<capability>%s</capability>' % c for c in self.capabilities])
+        return HELLO % (caps, self.session_id) + MSG_DELIM
+
+    def frame(self, msg):
+        "Delimits *msg* as negotiated."
+        if self.chunked:
+            return '\n#%d\n%s\n##\n' % (len(msg), msg)
+        return msg + MSG_DELIM
+
+    def _messages(self):
+        while True:
+            if not self.chunked:
+                idx = self._buf.find(MSG_DELIM)
+                if idx < 0:
+                    return
+                msg, self._buf = self._buf[:idx], self._buf[idx + len(MSG_DELIM):]
+                yield msg
+            else:
+                chunks, pos = [], 0
+                while True:
+                    if self._buf.startswith('\n##\n', pos):
+                        self._buf = self._buf[pos + 4:]
+                        break
+                    end = self._buf.find('\n', pos + 2)
+                    if not self._buf.startswith('\n#', pos) or end < 0:
+                        return
+                    size = int(self._buf[pos + 2:end])
+                    if len(self._buf) < end + 1 + size:
+                        return
+                    chunks.append(self._buf[end + 1:end + 1 + size])
+                    pos = end + 1 + size
+                yield ''.join(chunks)
+
+    def feed(self, data):
+        "Consumes *data* received from the client and returns the framed replies due, as a string."
+        self._buf += data
+        out = []
+        for msg in self._messages():
+            match = _RPC_RE.search(msg)
+            if match is None: # the client's <hello>
+                self.chunked = BASE_1_1 in self.capabilities and BASE_1_1 in msg
+                continue
+            msgid, op = match.groups()
+            out.append(self.frame(REPLY % (msgid, self.reply(op, msgid, msg))))
+            if op == 'close-session':
+                self.closed = True
+                break
+        return ''.join(out)
+
+
+class _Connection(object):
+
+    def __init__(self, sock, responder):
+        self.sock = sock
+        self.responder = responder
+        self.out = ''
+
+
+class LoopbackServer(Thread):
+
+    """Serves the :class:`LoopbackResponder` end of every :class:`LoopbackSession` from a single thread, so that thousands of sessions only cost one extra thread. Replies are queued and written as the client reads them; a *delay* is honoured without holding up other sessions."""
+
+    def __init__(self):
+        Thread.__init__(self)
+        self.setDaemon(True)
+        self.setName('loopback-server')
+        self._lock = Lock()
+        self._conns = {}
+        self._pending = [] # heap of (due, seq, fd, data)
+        self._seq = 0
+        self._poller = select.poll()
+        self._wake_r, self._wake_w = os.pipe()
+        self._poller.register(self._wake_r, select.POLLIN)
+
+    def attach(self, sock, responder):
+        "Starts serving *responder* on the server end *sock* of a socket pair."
+        sock.setblocking(0)
+        conn = _Connection(sock, responder)
+        conn.out = responder.hello()
+        with self._lock:
+            self._conns[sock.fileno()] = conn
+            self._poller.register(sock.fileno(), select.POLLIN | select.POLLOUT)
+        os.write(self._wake_w, 'x')
+
+    def _drop(self, fd):
+        with self._lock:
+            conn = self._conns.pop(fd, None)
+            if conn is not None:
+                self._poller.unregister(fd)
+        if conn is not None:
+            conn.sock.close()
+
+    def _queue(self, fd, conn, data):
+        if not data:
+            return
+        if conn.responder.delay:
+            self._seq += 1
+            heapq.heappush(self._pending, (time.time() + conn.responder.delay, self._seq, fd, data))
+        else:
+            conn.out += data
+            self._poller.modify(fd, select.POLLIN | select.POLLOUT)
+
+    def run(self):
+        while True:
+            timeout = None
+            if self._pending:
+                timeout = max(0, int((self._pending[0][0] - time.time()) * 1000))
+            try:
+                events = self._poller.poll(timeout)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            now = time.time()
+            while self._pending and self._pending[0][0] <= now:
+                due, seq, fd, data = heapq.heappop(self._pending)
+                conn = self._conns.get(fd)
+                if conn is not None:
+                    conn.out += data
+                    self._poller.modify(fd, select.POLLIN | select.POLLOUT)
+            for fd, event in events:
+                if fd == self._wake_r:
+                    os.read(fd, BUF_SIZE)
+                    continue
+                conn = self._conns.get(fd)
+                if conn is None:
+                    continue
+                try:
+                    if event & (select.POLLIN | select.POLLHUP | select.POLLERR):
+                        data = conn.sock.recv(BUF_SIZE)
+                        if not data:
+                            self._drop(fd)
+                            continue
+                        self._queue(fd, conn, conn.responder.feed(data))
+                    if event & select.POLLOUT and conn.out:
+                        n = conn.sock.send(conn.out)
+                        conn.out = conn.out[n:]
+                    if not conn.out:
+                        if conn.responder.closed:
+                            self._drop(fd)
+                        else:
+                            self._poller.modify(fd, select.POLLIN)
+                except socket.error as e:
+                    if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                        logger.debug('dropping loopback connection, error=%r', e)
+                        self._drop(fd)
+
+_server = None
+_server_lock = Lock()
+
+def loopback_server():
+    "Returns the :class:`LoopbackServer`, starting it on first use."
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = LoopbackServer()
+            _server.start()
+        return _server
+
+
+class LoopbackSession(Rfc4742Session):
+
+    """A NETCONF session with an in-process :class:`LoopbackResponder` over a socket pair. It runs the same framing code as the other :rfc:`4742` transports, but with no process to spawn and no SSH handshake."""
+
+    def __init__(self, capabilities):
+        super(LoopbackSession, self).__init__(capabilities)
+        self._socket = None
+        self._fd = None # outlives the socket, for unregistering
+        self._responder = None
+
+    def close(self):
+        self._connected = False
+        if self._reactor is not None:
+            self._reactor.remove(self)
+
+    def connect(self, responder=None):
+        """Connects to *responder*, a :class:`LoopbackResponder` with the default arguments if not specified, and initializes the NETCONF session."""
+        start = time.time()
+        self._responder = responder or LoopbackResponder()
+        self._socket, server_sock = socket.socketpair()
+        self._socket.setblocking(0)
+        self._fd = self._socket.fileno()
+        loopback_server().attach(server_sock, self._responder)
+        self._connected = True
+        self._post_connect()
+        self._metrics.connect_duration = time.time() - start
+
+    def _read(self):
+        try:
+            n = self._read_into(self._socket.recv_into, BUF_SIZE)
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            raise
+        if not n:
+            if not self._connected: # we closed it
+                return
+            raise SessionCloseError(self._received())
+
+    def _write(self, data):
+        try:
+            return self._socket.send(data)
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return 0
+            raise
+
+    def _read_fd(self):
+        return self._fd
+
+    def _write_fd(self):
+        return self._fd
+
+    def _io_closed(self):
+        self._socket.close()
+
+    @property
+    def responder(self):
+        "The :class:`LoopbackResponder` this session is connected to."
+        return self._responder
@@ -0,0 +1,98 @@
+# Copyright 2009 Shikhar Bhushan
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""What worked when connecting to each device, so that the next connection tries it first.
+
+A profile is a dictionary which may hold:
+
+* `auth` -- the authentication method that succeeded, one of `'publickey'`, `'agent'` or `'password'`
+* `key` -- the key file (for `'publickey'`) or the hex fingerprint of the agent key (for `'agent'`)
+* `channel` -- how the NETCONF channel was opened, `'subsystem'` or `'exec'`
+
+Passwords are never recorded.
+"""
+
+import os
+import json
+from threading import Lock
+
+import logging
+logger = logging.getLogger("ncclient.transport.profiles")
+
+
+class ProfileCache(object):
+
+    """Connection profiles by `host:port`, kept in memory and optionally persisted as JSON to *filename*, which is read if it exists and rewritten whenever a profile changes."""
+
+    def __init__(self, filename=None):
+        self._lock = Lock()
+        self._profiles = {}
+        self._filename = None
+        if filename is not None:
+            self.load(filename)
+
+    def load(self, filename):
+        "Reads the profiles stored in *filename*, if it exists, and persists changes to it from now on."
+        filename = os.path.expanduser(filename)
+        try:
+            with open(filename) as f:
+                profiles = json.load(f)
+        except IOError:
+            profiles = {}
+        except ValueError as e:
+            logger.warning("ignoring unreadable connection profiles in %s: %s", filename, e)
+            profiles = {}
+        with self._lock:
+            self._profiles.update(profiles)
+            self._filename = filename
+
+    def get(self, host, port):
+        "Returns a copy of the profile of *host* and *port*, empty if there is none."
+        with self._lock:
+            return dict(self._profiles.get('%s:%s' % (host, port), {}))
+
+    def update(self, host, port, **fields):
+        "Records *fields* in the profile of *host* and *port*."
+        key = '%s:%s' % (host, port)
+        with self._lock:
+            profile = self._profiles.setdefault(key, {})
+            if all(profile.get(k) == v for k, v in fields.iteritems()):
+                return
+            profile.update(fields)
+            if self._filename is not None:
+                self._save()
+
+    def forget(self, host, port):
+        "Drops the profile of *host* and *port*."
+        with self._lock:
+            if self._profiles.pop('%s:%s' % (host, port), None) is not None and self._filename is not None:
+                self._save()
+
+    def _save(self):
+        tmp = '%s.%d.tmp' % (self._filename, os.getpid())
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self._profiles, f, indent=1, sort_keys=True)
+            os.rename(tmp, self._filename)
+        except (IOError, OSError) as e:
+            logger.warning("could not save connection profiles to %s: %s", self._filename, e)
+
+    @property
+    def filename(self):
+        "The file profiles are persisted to, or `None`."
+        return self._filename
+
+
+#: The :class:`ProfileCache` used by :class:`~ncclient.transport.SSHSession`, in memory only until :meth:`~ProfileCache.load` is called on it
+profiles = ProfileCache()
@@ -0,0 +1,267 @@
+# Copyright 2009 Shikhar Bhushan
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""I/O of many sessions multiplexed through one thread.
+
+By default every session runs its own thread, which wakes up every tenth of a second to look for something to send. A session given a :class:`Reactor` instead (see :attr:`Session.reactor <ncclient.transport.Session.reactor>`) runs no thread of its own: the reactor waits on the file descriptors of all its sessions at once with `epoll` (or `poll` where that is unavailable), writes as soon as a message is queued and does not wake up at all while every session is idle. The :class:`~ncclient.manager.Manager` API remains synchronous.
+"""
+
+import os
+import time
+import errno
+import select
+from threading import Thread, Lock
+
+import logging
+logger = logging.getLogger("ncclient.transport.reactor")
+
+#: Number of reactor threads :func:`shared_reactor` spreads sessions over
+THREADS = 1
+
+#: Seconds between calls to a session's periodic checks, e.g. liveness
+TICK = 0.1
+
+#: Seconds between write attempts for a transport which cannot signal writability, e.g. an SSH channel
+RETRY = 0.01
+
+if hasattr(select, 'epoll'):
+    _IN, _OUT, _ERR = select.EPOLLIN, select.EPOLLOUT, select.EPOLLERR | select.EPOLLHUP
+else:
+    _IN, _OUT, _ERR = select.POLLIN, select.POLLOUT, select.POLLERR | select.POLLHUP
+
+
+class _Poller(object):
+
+    # epoll where available, poll otherwise; timeouts in seconds or None. A
+    # session may close its fd before it is unregistered, and the number be
+    # reused by another session by the time it is, so both are lenient.
+
+    def __init__(self):
+        if hasattr(select, 'epoll'):
+            self._poller = select.epoll()
+            self._scale = 1
+        else:
+            self._poller = select.poll()
+            self._scale = 1000
+        self.modify = self._poller.modify
+
+    def register(self, fd, events):
+        try:
+            self._poller.register(fd, events)
+        except (IOError, OSError) as e:
+            if e.errno != errno.EEXIST:
+                raise
+            self._poller.modify(fd, events)
+
+    def unregister(self, fd):
+        try:
+            self._poller.unregister(fd)
+        except (IOError, OSError, KeyError):
+            pass
+
+    def poll(self, timeout):
+        if timeout is None:
+            timeout = -1
+        else:
+            timeout *= self._scale
+        try:
+            return self._poller.poll(timeout)
+        except (IOError, select.error) as e:
+            if e.args[0] == errno.EINTR:
+                return []
+            raise
+
+
+class Reactor(Thread):
+
+    "Runs the I/O of the sessions :meth:`add`-ed to it from a single thread."
+
+    def __init__(self):
+        Thread.__init__(self)
+        self.setDaemon(True)
+        self.setName('reactor')
+        self._lock = Lock()
+        self._poller = _Poller()
+        self._sessions = {} # read fd -> session
+        self._writers = {} # write fd -> session, for write fd's registered separately
+        self._added = [] # sessions to register, from other threads
+        self._removed = []
+        self._ready = set() # sessions which queued a message
+        self._retry = set() # sessions with output pending on an fd-less transport
+        self._wake_r, self._wake_w = os.pipe()
+        self._woken = False
+        self._poller.register(self._wake_r, _IN)
+        self._ticks = False # whether any session has periodic checks
+        self._started = False
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _wake(self):
+        if not self._woken:
+            self._woken = True
+            try:
+                os.write(self._wake_w, 'x')
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+
+    def add(self, session):
+        "Takes over the I/O of the connected *session*."
+        with self._lock:
+            self._added.append(session)
+            self._ready.add(session)
+            self._wake()
+            if not self._started:
+                self._started = True
+                self.start()
+
+    def remove(self, session):
+        "Stops serving *session*, e.g. once it has been closed."
+        with self._lock:
+            self._removed.append(session)
+            self._wake()
+
+    def wakeup(self, session):
+        "Notes that *session* has queued a message to send."
+        with self._lock:
+            self._ready.add(session)
+            self._wake()
+
+    def refresh(self):
+        "Has the reactor look again at which of its sessions need periodic checks."
+        with self._lock:
+            self._ticks = True # until the next tick says otherwise
+            self._wake()
+
+    def _register(self, session):
+        rfd, wfd = session._read_fd(), session._write_fd()
+        self._sessions[rfd] = session
+        self._poller.register(rfd, _IN)
+        if wfd is not None and wfd != rfd:
+            self._writers[wfd] = session
+        self._ticks = self._ticks or session._ticking()
+
+    def _unregister(self, session):
+        rfd, wfd = session._read_fd(), session._write_fd()
+        if self._sessions.get(rfd) is not session:
+            return
+        del self._sessions[rfd]
+        self._poller.unregister(rfd)
+        if self._writers.get(wfd) is session:
+            del self._writers[wfd]
+            if session._out is not None:
+                self._poller.unregister(wfd)
+        self._retry.discard(session)
+        session._io_closed()
+
+    def _fail(self, session, e):
+        logger.debug("Broke out of I/O of %r, error=%r", session, e)
+        self._unregister(session)
+        session._io_error(e)
+
+    def _write(self, session):
+        wfd = session._write_fd()
+        waiting = session._out is not None
+        pending = session._io_write()
+        if wfd is None:
+            if pending:
+                self._retry.add(session)
+            else:
+                self._retry.discard(session)
+        elif pending != waiting:
+            # wait for writability only while output is pending
+            if wfd == session._read_fd():
+                self._poller.modify(wfd, _IN | _OUT if pending else _IN)
+            elif pending:
+                self._poller.register(wfd, _OUT)
+            else:
+                self._poller.unregister(wfd)
+
+    def run(self):
+        next_tick = time.time() + TICK
+        while True:
+            timeout = None
+            if self._retry:
+                timeout = RETRY
+            elif self._ticks:
+                timeout = max(0, next_tick - time.time())
+            events = self._poller.poll(timeout)
+
+            with self._lock:
+                added, self._added = self._added, []
+                removed, self._removed = self._removed, []
+                ready, self._ready = self._ready, set()
+                if self._woken:
+                    os.read(self._wake_r, 4096)
+                    self._woken = False
+            for session in removed:
+                self._unregister(session)
+            for session in added:
+                if session._connected:
+                    self._register(session)
+
+            for fd, event in events:
+                if fd == self._wake_r:
+                    continue
+                session = self._sessions.get(fd)
+                if session is None:
+                    session = self._writers.get(fd)
+                    if session is not None:
+                        ready.add(session)
+                    continue
+                if event & (_IN | _ERR):
+                    try:
+                        session._read()
+                    except Exception as e:
+                        self._fail(session, e)
+                        continue
+                    if not session._connected:
+                        self._unregister(session)
+                        continue
+                if event & _OUT:
+                    ready.add(session)
+
+            for session in ready | self._retry:
+                if self._sessions.get(session._read_fd()) is not session:
+                    continue
+                try:
+                    self._write(session)
+                except Exception as e:
+                    self._fail(session, e)
+
+            now = time.time()
+            if self._ticks and now >= next_tick:
+                next_tick = now + TICK
+                ticks = False
+                for session in self._sessions.values():
+                    if session._ticking():
+                        ticks = True
+                        try:
+                            session._io_tick()
+                        except Exception as e:
+                            self._fail(session, e)
+                self._ticks = ticks
+
+
+_reactors = []
+_reactors_lock = Lock()
+
+def shared_reactor():
+    "Returns the least loaded of the :data:`THREADS` reactors shared by the process, creating it on first use."
+    with _reactors_lock:
+        if len(_reactors) < THREADS:
+            _reactors.append(Reactor())
+            return _reactors[-1]
+        return min(_reactors, key=len)
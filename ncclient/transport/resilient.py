@@ -0,0 +1,224 @@
+# Copyright 2009 Shikhar Bhushan
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"A session which survives the loss of its transport by reconnecting"
+
+from Queue import Queue
+from threading import Event
+
+from ncclient.xml_ import qualify, root_children
+
+from errors import TransportError
+from session import Session, SessionListener, MessageStream
+from trace import IN, OUT, message_id
+
+import logging
+logger = logging.getLogger("ncclient.transport.resilient")
+
+#: Connection attempts made after the transport is lost before giving up
+RETRIES = 5
+
+#: Seconds waited after the first failed attempt, doubling with every further one
+BACKOFF = 0.5
+
+#: Upper bound of the wait between attempts
+MAX_BACKOFF = 30
+
+
+_OK = qualify('ok')
+
+def _ok(raw):
+    # whether the rpc-reply raw is an <ok/>
+    try:
+        return any(tag == _OK for tag, start, end, namespaces in root_children(raw))
+    except ValueError:
+        return False
+
+
+class _Relay(SessionListener):
+
+    # installed on each underlying session
+
+    RAW_BUFFER = True # passed on as the listeners of the owner ask for it
+
+    def __init__(self, owner, session):
+        self._owner = owner
+        self._session = session
+
+    def callback(self, root, raw):
+        self._owner._relay_message(self._session, root, raw)
+
+    def errback(self, err):
+        self._owner._relay_error(self._session, err)
+
+
+class ResilientSession(Session):
+
+    """Stands in for a session obtained from *factory*, a callable returning a connected :class:`Session`, and replaces it with a fresh one from *factory* when its transport is lost. Connection attempts are retried up to *retries* times (`None` for ever), waiting *backoff* seconds after the first failure and twice as long after each further one, up to *max_backoff*.
+
+    Requests which were unanswered when the transport was lost are sent again on the new session if their listener allows it: see :meth:`SessionListener.reconnecting`. For RPC's that means those which are :attr:`~ncclient.operations.RPC.idempotent`, the others fail with the transport error. Listeners only see an :meth:`~SessionListener.errback` once reconnecting has been given up, or the session closed.
+
+    Note that whatever lived in the NETCONF session on the device, e.g. locks, does not survive a reconnect. The :attr:`metrics` account for RPC's across reconnects; the transport counters of the current connection are in :attr:`current`'s.
+    """
+
+    def __init__(self, factory, retries=RETRIES, backoff=BACKOFF, max_backoff=MAX_BACKOFF):
+        Session.__init__(self, None)
+        self.setName('resilient-session')
+        self._factory = factory
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._current = None
+        self._lost = Queue() # errors for the supervisor, None to stop it
+        self._stopped = Event()
+        self._closing = False
+        self._close_id = None # message-id of a close-session, see expect_close()
+        self._failed = False # gave up reconnecting
+        self._seq = 0
+        self._unanswered = {} # message-id -> (seq, message, sent)
+        self._dropped = set() # message-id's not to be sent, their requests failed
+
+    def connect(self):
+        "Obtains the first session from the factory, and starts watching over it."
+        self._attach(self._factory())
+        self.start()
+
+    def close(self):
+        self._closing = True
+        self._stopped.set()
+        self._lost.put(None)
+        current = self._current
+        if current is not None:
+            current.close()
+        self._connected = False
+
+    def _attach(self, session):
+        session.add_listener(_Relay(self, session))
+        with self._lock:
+            self._client_capabilities = session.client_capabilities
+            self._server_capabilities = session.server_capabilities
+            self._id = session.id
+            self._current = session
+            self._connected = True
+            resend = sorted(self._unanswered.items(), key=lambda item: item[1][0])
+            for id, (seq, message, sent) in resend:
+                self._unanswered[id] = (seq, message, True)
+        for id, (seq, message, sent) in resend:
+            logger.debug('%s message-id=%s', 'resending' if sent else 'sending', id)
+            session.send(message)
+
+    def expect_close(self, message_id):
+        """Once the `close-session` request with *message_id* is answered with `ok`, the transport closed by the server is not replaced."""
+        self._close_id = message_id
+
+    def _relay_message(self, session, root, raw):
+        if session is not self._current:
+            return
+        if self._trace is not None:
+            self._trace.record(IN, self._id, raw)
+        tag, attrs = root
+        if tag == qualify('rpc-reply'):
+            id = attrs.get('message-id')
+            with self._lock:
+                self._unanswered.pop(id, None)
+            if id is not None and id == self._close_id and _ok(raw):
+                # the server is about to close the transport, that is no loss
+                self._closing = True
+        with self._lock:
+            listeners = list(self._listeners)
+        self._callback(listeners, root, raw)
+
+    def _relay_error(self, session, err):
+        with self._lock:
+            if session is not self._current:
+                return
+            self._current = None
+            self._connected = False
+            listeners = list(self._listeners)
+        if self._closing:
+            self._dispatch_error(err)
+            return
+        logger.info('session-id=%s lost its transport, reconnecting: %r', self._id, err)
+        dropped = set()
+        for l in listeners:
+            try:
+                dropped.update(l.reconnecting(err) or ())
+            except Exception as e:
+                logger.warning('error dispatching to %r: %r', l, e)
+        with self._lock:
+            self._dropped = dropped
+            for id in dropped:
+                self._unanswered.pop(id, None)
+        self._lost.put(err)
+
+    def run(self):
+        while True:
+            err = self._lost.get()
+            if err is None or self._closing:
+                return
+            delay = self._backoff
+            attempt = 0
+            while True:
+                try:
+                    session = self._factory()
+                except Exception as e:
+                    attempt += 1
+                    logger.info('reconnect attempt %d failed: %r', attempt, e)
+                    err = e
+                    if self._retries is not None and attempt > self._retries:
+                        break
+                    self._stopped.wait(delay)
+                    delay = min(delay * 2, self._max_backoff)
+                    if self._closing:
+                        return
+                    continue
+                if self._closing:
+                    session.close()
+                    return
+                self._attach(session)
+                self._metrics.reconnects += 1
+                break
+            if not self._connected:
+                logger.warning('giving up reconnecting after %d attempts', attempt)
+                self._failed = True
+                self._dispatch_error(err)
+                return
+
+    def send(self, message):
+        """Send the supplied *message* (xml string) to NETCONF server, or keep it to be sent once reconnected."""
+        if self._failed or self._closing and self._current is None:
+            raise TransportError('Not connected to NETCONF server')
+        # of a stream only the head can be looked at; its request is not
+        # idempotent, so it is not sent again anyway
+        raw = message.head if isinstance(message, MessageStream) else message
+        if self._trace is not None:
+            self._trace.record(OUT, self._id, raw)
+        id = message_id(raw)
+        with self._lock:
+            if id in self._dropped:
+                return # its request failed already
+            current = self._current
+            if id is not None:
+                self._seq += 1
+                self._unanswered[id] = (self._seq, message, current is not None)
+        if current is not None:
+            try:
+                current.send(message)
+            except TransportError:
+                pass # lost meanwhile, sent once reconnected
+
+    @property
+    def current(self):
+        "The underlying :class:`Session` currently in use, `None` while reconnecting."
+        return self._current
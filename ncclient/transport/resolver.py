@@ -0,0 +1,171 @@
+# Copyright 2009 Shikhar Bhushan
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"Cached name resolution and racing connection attempts across the resolved addresses"
+
+import os
+import time
+import errno
+import socket
+from select import poll, POLLOUT, POLLERR, POLLHUP
+from threading import Thread, Lock
+
+import logging
+logger = logging.getLogger("ncclient.transport.resolver")
+
+#: Seconds a resolved address list is reused
+DNS_TTL = 300
+
+#: Seconds to wait on a connection attempt before starting one to the next address
+CONNECT_DELAY = 0.25
+
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN)
+
+
+def _getaddrinfo(host, port, timeout):
+    if timeout is None:
+        return socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
+    # the resolver has no timeout of its own, so leave it behind if it is slow
+    result = []
+    def resolve():
+        try:
+            result.append(socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM))
+        except Exception as e:
+            result.append(e)
+    t = Thread(target=resolve, name='resolve-%s' % host)
+    t.setDaemon(True)
+    t.start()
+    t.join(timeout)
+    if not result:
+        raise socket.timeout('timed out resolving %s' % host)
+    if isinstance(result[0], Exception):
+        raise result[0]
+    return result[0]
+
+
+class ResolverCache(object):
+
+    """`socket.getaddrinfo` results shared by all sessions, each reused for *ttl* seconds. Failures are not cached."""
+
+    def __init__(self, ttl=DNS_TTL):
+        self._ttl = ttl
+        self._lock = Lock()
+        self._entries = {} # (host, port) -> (expiry, addrinfo list)
+
+    def getaddrinfo(self, host, port, timeout=None):
+        """Returns the list of `socket.getaddrinfo` tuples for stream connections to *host* and *port*, resolving it if needed. Raises :exc:`socket.timeout` if that takes longer than *timeout* seconds."""
+        key = (host, port)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        addrs = _getaddrinfo(host, port, timeout)
+        with self._lock:
+            self._entries[key] = (time.time() + self._ttl, addrs)
+        return addrs
+
+    def forget(self, host, port):
+        "Drops the cached addresses of *host* and *port*, e.g. because none of them could be reached."
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def clear(self):
+        "Drops all cached addresses."
+        with self._lock:
+            self._entries.clear()
+
+
+#: The :class:`ResolverCache` used by :class:`~ncclient.transport.SSHSession`
+resolver = ResolverCache()
+
+
+def _interleave(addrs):
+    # alternate address families, starting with the preferred (first) one
+    families = []
+    by_family = {}
+    for addr in addrs:
+        if addr[0] not in by_family:
+            families.append(addr[0])
+            by_family[addr[0]] = []
+        by_family[addr[0]].append(addr)
+    result = []
+    while any(by_family.values()):
+        for af in families:
+            if by_family[af]:
+                result.append(by_family[af].pop(0))
+    return result
+
+
+def connect_any(addrs, timeout=None, delay=CONNECT_DELAY):
+    """Connects to the first reachable of *addrs*, a list of `socket.getaddrinfo` tuples, in the manner of :rfc:`8305` ("happy eyeballs"): attempts are started *delay* seconds apart (or as soon as the previous one fails) alternating between address families, and the first to complete wins. A dead address therefore only costs *delay* rather than a full timeout.
+
+    Returns the connected socket, in blocking mode. Raises :exc:`socket.timeout` if none connected within *timeout* seconds, or the error of the last attempt.
+    """
+    addrs = _interleave(addrs)
+    deadline = time.time() + timeout if timeout is not None else None
+    pending = {} # fd -> (socket, address)
+    poller = poll() # unlike select, not limited to fd's below FD_SETSIZE
+    winner = None
+    error = socket.timeout('timed out')
+    next_start = 0
+
+    try:
+        while winner is None and (addrs or pending):
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                error = socket.timeout('timed out')
+                break
+            if addrs and now >= next_start:
+                af, socktype, proto, canonname, sa = addrs.pop(0)
+                try:
+                    sock = socket.socket(af, socktype, proto)
+                except socket.error as e:
+                    error = e
+                    continue
+                sock.setblocking(0)
+                err = sock.connect_ex(sa)
+                if err == 0:
+                    winner = sock
+                    break
+                if err not in _IN_PROGRESS:
+                    sock.close()
+                    error = socket.error(err, os.strerror(err))
+                    continue
+                pending[sock.fileno()] = (sock, sa)
+                poller.register(sock, POLLOUT | POLLERR | POLLHUP)
+                next_start = now + delay
+            wait = []
+            if addrs:
+                wait.append(max(0, next_start - now))
+            if deadline is not None:
+                wait.append(max(0, deadline - now))
+            for fd, event in poller.poll(min(wait) * 1000 if wait else None):
+                sock, sa = pending.pop(fd)
+                poller.unregister(fd)
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0:
+                    winner = sock
+                    break
+                logger.debug("could not connect to %s: %s", sa, os.strerror(err))
+                sock.close()
+                error = socket.error(err, os.strerror(err))
+                next_start = 0 # try the next address right away
+    finally:
+        for sock, sa in pending.itervalues():
+            sock.close()
+
+    if winner is None:
+        raise error
+    winner.setblocking(1)
+    return winner
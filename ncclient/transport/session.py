@@ -15,16 +15,82 @@
 
 from Queue import Queue
 import os
+import re
+import time
+from select import poll, POLLIN, POLLOUT
 from threading import Thread, Lock, Event
 
 from ncclient.xml_ import *
 from ncclient.capabilities import Capabilities
+from ncclient.metrics import SessionMetrics
 
-from errors import TransportError
+from errors import TransportError, SessionTimeoutError
+from trace import IN, OUT
 
 import logging
 logger = logging.getLogger('ncclient.transport.session')
 
+BASE_1_0 = 'urn:ietf:params:netconf:base:1.0'
+BASE_1_1 = 'urn:ietf:params:netconf:base:1.1'
+
+TICK = 0.1
+
+#: Bytes written at most before looking for something to read again, so that large messages do not hold up incoming traffic
+WRITE_BURST = 256 * 1024
+
+#: Default size of the largest chunk sent in v1.1 chunked framing
+CHUNK_SIZE = 65536
+
+# smaller messages are framed in one string, a copy being cheaper than writes
+_COALESCE_SIZE = 4096
+
+MSG_DELIM = "]]>]]>"
+END_DELIM = "\n##\n"
+
+# a v1.1 chunk header or end-of-chunks marker, and what may be the start of one
+_CHUNK_HEADER_RE = re.compile(r'\n#(?:#|([1-9][0-9]{0,9}))\n')
+_CHUNK_HEADER_START_RE = re.compile(r'\n(?:#(?:#|[1-9][0-9]{0,9})?)?\Z')
+
+# bytes read at once where a chunk header is expected after a large chunk,
+# so that little of the next chunk lands in front of its place
+_HEADER_READ = 16
+
+_WHITESPACE = frozenset(map(ord, ' \t\r\n'))
+
+
+def _bytes(s):
+    "*s* as a byte string, unicode being encoded to UTF-8."
+    return s.encode('utf-8') if isinstance(s, unicode) else s
+
+def encode_chunks(pieces, size=CHUNK_SIZE):
+    """Yields the v1.1 chunked framing of the message made of *pieces*, an iterable of byte strings: for each chunk of at most *size* bytes its header, then a :func:`buffer` over the piece it comes from (rather than a copy), and finally the end-of-chunks marker."""
+    for piece in pieces:
+        length = len(piece)
+        for start in xrange(0, length, size):
+            n = min(size, length - start)
+            yield "\n#%d\n" % n
+            yield piece if n == length else buffer(piece, start, n)
+    yield END_DELIM
+
+class MessageStream(object):
+
+    """An outbound message whose *body*, an iterable of strings, is only produced as it is being sent, so that it need not be held in memory as a whole. *head* and *tail* are the strings around it. It can only be sent once, as byte strings: unicode is encoded to UTF-8."""
+
+    def __init__(self, head, body, tail):
+        self.head = head
+        self.body = body
+        self.tail = tail
+
+    def __iter__(self):
+        yield _bytes(self.head)
+        for part in self.body:
+            yield _bytes(part)
+        yield _bytes(self.tail)
+
+    def __repr__(self):
+        return '%s...%s' % (self.head, self.tail)
+
+
 class Session(Thread):
 
     "Base class for use by transport protocol implementations."
@@ -40,10 +106,21 @@ class Session(Thread):
         self._server_capabilities = None # yet
         self._id = None # session-id
         self._connected = False # to be set/cleared by subclass implementation
-        logger.debug('%r created: client_capabilities=%r' %
-                     (self, self._client_capabilities))
+        self._trace = None # see trace property
+        self._reactor = None # see reactor property
+        self._reply_listener = None # routes rpc-replies, see ncclient.operations.rpc
+        self._metrics = SessionMetrics(self)
+        logger.debug('%r created: client_capabilities=%r',
+                     self, self._client_capabilities)
 
     def _dispatch_message(self, raw):
+        # raw is the buffer the message was received into, which is ours
+        # alone, see _dispatch_buffer(); only read-only views of it go out
+        if isinstance(raw, bytearray):
+            raw = buffer(raw)
+        if self._trace is not None:
+            self._trace.record(IN, self._id, raw)
+        self._metrics.messages_in += 1
         try:
             root = parse_root(raw)
         except Exception as e:
@@ -51,9 +128,17 @@ class Session(Thread):
             return
         with self._lock:
             listeners = list(self._listeners)
+        self._callback(listeners, root, raw)
+
+    def _callback(self, listeners, root, raw):
+        # passes the message to each listener as it asked for it, making a
+        # string of it only once and only if needed
+        text = raw if isinstance(raw, str) else None
         for l in listeners:
-            logger.debug('dispatching message to %r: %s' % (l, raw))
-            l.callback(root, raw) # no try-except; fail loudly if you must!
+            if not l.RAW_BUFFER and text is None:
+                text = str(raw)
+            logger.debug('dispatching message to %r: %s', l, raw)
+            l.callback(root, raw if l.RAW_BUFFER else text) # no try-except; fail loudly if you must!
     
     def _dispatch_error(self, err):
         with self._lock:
@@ -65,8 +150,8 @@ class Session(Thread):
             except Exception as e:
                 logger.warning('error dispatching to %r: %r' % (l, e))
 
-    def _post_connect(self):
-        "Greeting stuff"
+    def _post_connect(self, timeout=None):
+        "Greeting stuff, giving up after *timeout* seconds if specified"
         init_event = Event()
         error = [None] # so that err_cb can bind error[0]. just how it is.
         # callbacks
@@ -79,13 +164,21 @@ class Session(Thread):
             init_event.set()
         listener = HelloHandler(ok_cb, err_cb)
         self.add_listener(listener)
+        start = time.time()
         self.send(HelloHandler.build(self._client_capabilities))
         logger.debug('starting main loop')
-        self.start()
+        if self._reactor is None:
+            self.start()
+        else:
+            self._reactor.add(self)
         # we expect server's hello message
-        init_event.wait()
+        init_event.wait(timeout)
         # received hello message or an error happened
         self.remove_listener(listener)
+        self._metrics.hello_duration = self._metrics.connect_phases['hello'] = time.time() - start
+        if not init_event.isSet():
+            self.close()
+            raise SessionTimeoutError('hello', timeout)
         if error[0]:
             raise error[0]
         #if ':base:1.0' not in self.server_capabilities:
@@ -115,6 +208,10 @@ class Session(Thread):
         with self._lock:
             self._listeners.discard(listener)
 
+    def expect_close(self, message_id):
+        """Notes that the request with *message_id* is a `close-session`, after a successful reply to which the server closes the transport. Does nothing by default, see :class:`ResilientSession`."""
+        pass
+
     def get_listener_instance(self, cls):
         """If a listener of the specified type is registered, returns the
         instance.
@@ -133,11 +230,53 @@ class Session(Thread):
         raise NotImplementedError
 
     def send(self, message):
-        """Send the supplied *message* (xml string) to NETCONF server."""
+        """Send the supplied *message* (xml string or :class:`MessageStream`) to NETCONF server. A unicode string is sent encoded to UTF-8."""
         if not self.connected:
             raise TransportError('Not connected to NETCONF server')
-        logger.debug('queueing %s' % message)
+        if not isinstance(message, MessageStream):
+            # framing and writing work on the bytes, never on unicode storage
+            message = _bytes(message)
+        if self._trace is not None:
+            # of a stream, only the head is known by now
+            self._trace.record(OUT, self._id, message.head if isinstance(message, MessageStream) else message)
+        logger.debug('queueing %s', message)
         self._q.put(message)
+        if self._reactor is not None:
+            self._reactor.wakeup(self)
+
+    # I/O handlers, called from the session's own thread or its reactor
+
+    def _read_fd(self):
+        "The file descriptor which becomes readable when there is something to :meth:`_read`."
+        raise NotImplementedError
+
+    def _write_fd(self):
+        "The file descriptor which becomes writable when :meth:`_io_write` can make progress, `None` if there is none."
+        return None
+
+    def _read(self):
+        "Reads and dispatches whatever is available, raising an exception if the transport was lost."
+        raise NotImplementedError
+
+    def _io_write(self):
+        "Writes queued messages for as long as the transport takes them, up to :data:`WRITE_BURST` bytes, returning `True` if output remains pending."
+        raise NotImplementedError
+
+    def _io_error(self, err):
+        "The transport was lost with *err*."
+        self.close()
+        self._dispatch_error(err)
+
+    def _io_closed(self):
+        "I/O on the session has stopped."
+        pass
+
+    def _ticking(self):
+        "Whether :meth:`_io_tick` should be called periodically."
+        return False
+
+    def _io_tick(self):
+        pass
 
     ### Properties
 
@@ -161,6 +300,25 @@ class Session(Thread):
         """A string representing the `session-id`. If the session has not been initialized it will be `None`"""
         return self._id
 
+    @property
+    def metrics(self):
+        "The :class:`~ncclient.metrics.SessionMetrics` of this session."
+        return self._metrics
+
+    def __set_trace(self, trace):
+        self._trace = trace
+
+    trace = property(fget=lambda self: self._trace, fset=__set_trace)
+    "The :class:`~ncclient.transport.trace.WireTrace` recording messages of this session, or `None` (the default) when tracing is disabled."
+
+    def __set_reactor(self, reactor):
+        if self._connected:
+            raise TransportError('Cannot change the reactor of a connected session')
+        self._reactor = reactor
+
+    reactor = property(fget=lambda self: self._reactor, fset=__set_reactor)
+    "The :class:`~ncclient.transport.reactor.Reactor` running the I/O of this session, or `None` (the default) for the session to run a thread of its own. Can only be set before connecting."
+
 
 class Rfc4742Session(Session):
     """
@@ -168,195 +326,287 @@ class Rfc4742Session(Session):
     """
 
     # v1.0: RFC 4742
-    MSG_DELIM = "]]>]]>"
+    MSG_DELIM = MSG_DELIM
     # v1.1: RFC 6242
-    END_DELIM = '\n##\n'
+    END_DELIM = END_DELIM
 
     def __init__(self, capabilities):
         super(Rfc4742Session, self).__init__(capabilities)
-        self._buffer = StringIO()  # for incoming data
-        # parsing-related, see _parse()
-        self._parsing_state10 = 0
-        self._parsing_pos10 = 0
-        self._parsing_pos11 = 0
-        self._parsing_state11 = 0
-        self._expchunksize = 0
-        self._curchunksize = 0
-        self._inendpos = 0
-        self._message = []
+        # incoming data is read straight into the buffer of the message it
+        # belongs to, see _read_into(), which is handed on once complete
+        self._buffer = bytearray()
+        self._fill = 0 # bytes read into the buffer
+        self._scan = 0 # v1.0: where to look for the delimiter from
+        self._msg_end = 0 # v1.1: end of the message received so far ...
+        self._raw_pos = 0 # ... and of the bytes taken from the buffer, chunk headers included
+        self._chunk_left = 0 # v1.1: bytes of the current chunk yet to come
+        self._large_chunks = False # v1.1: whether chunks taking more than a read were seen
+        self._read_max = 0 # bytes asked for by the last _read_into()
+        self._out = None # framed piece being written, see _io_write()
+        self._sent = 0 # ... and how much of it
+        self._pieces = None # the rest of the message being written
+        self._chunk_size = CHUNK_SIZE
+
+    def _write(self, data):
+        "Writes as much of *data* as the transport takes without blocking, returning the number of bytes written."
+        raise NotImplementedError
 
-    def _parse10(self):
+    def _io_write(self):
+        written = 0
+        while True:
+            if self._out is None:
+                if self._pieces is None:
+                    if self._q.empty():
+                        return False
+                    message = self._q.get()
+                    logger.debug("Sending: %s", message)
+                    self._pieces = self._framed(message)
+                try:
+                    self._out, self._sent = self._pieces.next(), 0
+                except StopIteration:
+                    self._pieces = None
+                    self._metrics.messages_out += 1
+                    continue
+                if not self._out:
+                    self._out = None
+                    continue
+            elif written >= WRITE_BURST:
+                return True # more to write, after reading
+            n = self._write(buffer(self._out, self._sent))
+            if not n:
+                return True
+            written += n
+            self._sent += n
+            self._metrics.bytes_out += n
+            if self._sent == len(self._out):
+                self._out = None
+
+    def run(self):
+        # poll rather than select, which cannot handle fd's beyond 1024
+        rfd, wfd = self._read_fd(), self._write_fd()
+        poller = poll()
+        poller.register(rfd, POLLIN)
+        waiting = False
+        try:
+            while self._connected:
+                timeout = 0 if not waiting and not self._q.empty() else TICK
+                for fd, event in poller.poll(timeout * 1000):
+                    if fd == rfd and event & ~POLLOUT:
+                        self._read()
+                pending = self._io_write()
+                if pending != waiting:
+                    # wait for writability only while output is pending
+                    if wfd == rfd:
+                        poller.modify(rfd, POLLIN | POLLOUT if pending else POLLIN)
+                    elif pending:
+                        poller.register(wfd, POLLOUT)
+                    else:
+                        poller.unregister(wfd)
+                    waiting = pending
+        except Exception as e:
+            logger.debug("Broke out of main loop, error=%r", e)
+            self._io_error(e)
+        self._io_closed()
+        logger.debug("End of main loop.")
+
+    def _read_into(self, readinto, size):
+        """Reads at most *size* bytes from the transport straight into the message buffer by calling *readinto* (e.g. a socket's `recv_into`) with a writable :class:`memoryview` of it, then runs the framer of the negotiated protocol version over them. Returns what *readinto* did: the number of bytes read, `0` at the end of the stream, or `None` if nothing was available.
+
+        In v1.1 framing reads end where the current chunk does, and once the server has been seen sending chunks larger than a read, reads where a header is due take little more than the header, so that chunks land where they belong in the message rather than having to be moved up against the one before."""
+        self._read_max = size
+        if self._chunk_left:
+            size = min(size, self._chunk_left)
+        elif self._large_chunks:
+            # the header only, if the server sends large chunks
+            size = min(size, _HEADER_READ)
+        self._make_room(size)
+        view = memoryview(self._buffer)[self._fill:self._fill + size]
+        try:
+            n = readinto(view)
+        finally:
+            del view # the buffer cannot be resized while viewed
+        if n:
+            self._fill += n
+            self._metrics.bytes_in += n
+            self._frame_in()
+        return n
+
+    def _parse(self, data):
+        """Appends *data* read from the transport to the message buffer and runs the framer of the negotiated protocol version over it. For transports which cannot read into a buffer, see :meth:`_read_into`."""
+        n = len(data)
+        self._make_room(n)
+        self._buffer[self._fill:self._fill + n] = data
+        self._fill += n
+        self._metrics.bytes_in += n
+        self._frame_in()
+
+    def _make_room(self, size):
+        # makes room for *size* more bytes at the end of the buffer, growing
+        # it geometrically
+        if self._chunk_left and self._raw_pos == self._fill:
+            # nothing after the message received so far but chunk headers
+            # taken already, go on from its end
+            self._fill = self._raw_pos = self._msg_end
+        buf = self._buffer
+        if len(buf) < self._fill + size:
+            buf.extend(bytearray(max(self._fill + size - len(buf), len(buf))))
 
-        """Messages are delimited by MSG_DELIM. The buffer could have grown by
-        a maximum of BUF_SIZE bytes everytime this method is called. Retains
-        state across method calls and if a byte has been read it will not be
-        considered again."""
+    def _received(self):
+        "Bytes received which are not part of a message dispatched yet, as a string."
+        return str(self._buffer[:self._fill])
 
-        logger.debug("parsing netconf v1.0")
-        delim = self.MSG_DELIM
-        n = len(delim) - 1
-        expect = self._parsing_state10
-        buf = self._buffer
-        buf.seek(self._parsing_pos10)
+    def _frame_in(self):
+        # dispatch the messages received whole; the framing may change after
+        # the hello, so decide on it for each message
         while True:
-            x = buf.read(1)
-            if not x:  # done reading
-                break
-            elif x == delim[expect]:  # what we expected
-                expect += 1  # expect the next delim char
-            else:
-                expect = 0
-                continue
-                # loop till last delim char expected, break if other char encountered
-            for i in range(expect, n):
-                x = buf.read(1)
-                if not x:  # done reading
-                    break
-                if x == delim[expect]:  # what we expected
-                    expect += 1  # expect the next delim char
+            if self._server_capabilities:
+                if BASE_1_1 in self._server_capabilities and BASE_1_1 in self._client_capabilities:
+                    complete = self._parse11()
+                elif BASE_1_0 in self._server_capabilities or BASE_1_0 in self._client_capabilities:
+                    complete = self._parse10()
                 else:
-                    expect = 0  # reset
-                    break
-            else:  # if we didn't break out of the loop, full delim was parsed
-                msg_till = buf.tell() - n
-                buf.seek(0)
-                logger.debug('parsed new message')
-                self._dispatch_message(buf.read(msg_till).strip())
-                buf.seek(n + 1, os.SEEK_CUR)
-                rest = buf.read()
-                buf = StringIO()
-                buf.write(rest)
-                buf.seek(0)
-                expect = 0
-        self._buffer = buf
-        self._parsing_state = expect
-        self._parsing_pos10 = self._buffer.tell()
+                    raise Exception("No capabilities for reading data.")
+            else:
+                complete = self._parse10()  # HELLO msg uses EOM markers.
+            if not complete:
+                return
 
-    def _parse11(self):
-        logger.debug("parsing netconf v1.1")
-        message = self._message
-        expchunksize = self._expchunksize
-        curchunksize = self._curchunksize
-        idle, instart, inmsg, inbetween, inend = range(5)
-        state = self._parsing_state11
-        inendpos = self._inendpos
-        MAX_STARTCHUNK_SIZE = 10  # 4294967295
-        pre = 'invalid base:1:1 frame'
+    def _dispatch_buffer(self, end, rest):
+        """Dispatches the message buffer, cut down to the message ending at *end*, without copying it, and moves the bytes from *rest* on, which belong to the next message, to a buffer of their own."""
         buf = self._buffer
-        buf.seek(self._parsing_pos11)
-        num = []
+        leftover = buf[rest:self._fill]
+        self._metrics.bytes_moved += len(leftover)
+        self._buffer, self._fill = leftover, len(leftover)
+        self._scan = self._msg_end = self._raw_pos = self._chunk_left = 0
+        del buf[end:]
+        logger.debug('parsed new message')
+        self._dispatch_message(buf)
 
+    def _parse10(self):
+        """Dispatches the message in the buffer if it has been received up to MSG_DELIM, stripped of surrounding whitespace. Returns whether it has."""
+        buf = self._buffer
+        delim = self.MSG_DELIM
+        if not self._scan:
+            # drop whitespace before the message as it comes in, rather than
+            # moving the whole message once complete
+            start = 0
+            while start < self._fill and buf[start] in _WHITESPACE:
+                start += 1
+            if start:
+                del buf[:start]
+                self._fill -= start
+                self._metrics.bytes_moved += self._fill
+        end = buf.find(delim, self._scan, self._fill)
+        if end < 0:
+            # the delimiter may have been received in part
+            self._scan = max(0, self._fill - len(delim) + 1)
+            return False
+        self._metrics.frames_in += 1
+        rest = end + len(delim)
+        if self._server_capabilities:
+            # whitespace after the delimiter belongs to neither message (the
+            # framing may change after the hello though)
+            while rest < self._fill and buf[rest] in _WHITESPACE:
+                rest += 1
+        while end and buf[end - 1] in _WHITESPACE:
+            end -= 1
+        self._dispatch_buffer(end, rest)
+        return True
+
+    def _parse11(self):
+        """Takes the chunks received from the buffer, moving them up against each other where headers separate them, and dispatches the message once its end-of-chunks marker has been received. Returns whether it has."""
+        buf, fill = self._buffer, self._fill
+        msg_end, pos, left = self._msg_end, self._raw_pos, self._chunk_left
         while True:
-            x = buf.read(1)
-            if not x:
-                break  # done reading
-            # logger.debug('x: %s', x)
-            if state == idle:
-                if x == '\n':
-                    state = instart
-                    inendpos = 1
-                else:
-                    logger.debug("buf:%s" % buf.getvalue())
-                    logger.debug('%s (%s: expect newline)' % (pre, state))
-                    raise Exception
-            elif state == instart:
-                if inendpos == 1:
-                    if x == '#':
-                        inendpos += 1
-                    else:
-                        logger.debug('%s (%s: expect "#")' % (pre, state))
-                        raise Exception
-                elif inendpos == 2:
-                    if x.isdigit():
-                        inendpos += 1  # == 3 now #
-                        num.append(x)
-                    else:
-                        logger.debug('%s (%s: expect digit)' % (pre, state))
-                        raise Exception
-                else:
-                    if inendpos == MAX_STARTCHUNK_SIZE:
-                        logger.debug('%s (%s: no. too long)' % (pre, state))
-                        raise Exception
-                    elif x == '\n':
-                        num = ''.join(num)
-                        try:
-                            num = long(num)
-                        except:
-                            logger.debug('%s (%s: invalid no.)' % (pre, state))
-                            raise Exception
-                        else:
-                            state = inmsg
-                            expchunksize = num
-                            logger.debug('response length: %d' % expchunksize)
-                            curchunksize = 0
-                            inendpos += 1
-                    elif x.isdigit():
-                        inendpos += 1  # > 3 now #
-                        num.append(x)
-                    else:
-                        logger.debug('%s (%s: expect digit)' % (pre, state))
-                        raise Exception
-            elif state == inmsg:
-                message.append(x)
-                curchunksize += 1
-                chunkleft = expchunksize - curchunksize
-                if chunkleft == 0:
-                    inendpos = 0
-                    state = inbetween
-                    message = ''.join(message)
-                    logger.debug('parsed new message: %s' % message)
-            elif state == inbetween:
-                if inendpos == 0:
-                    if x == '\n':
-                        inendpos += 1
-                    else:
-                        logger.debug('%s (%s: expect newline)' % (pre, state))
-                        raise Exception
-                elif inendpos == 1:
-                    if x == '#':
-                        inendpos += 1
-                    else:
-                        logger.debug('%s (%s: expect "#")' % (pre, state))
-                        raise Exception
-                else:
-                    if x == '#':
-                        inendpos += 1  # == 3 now #
-                        state = inend
-                    else:
-                        logger.debug('%s (%s: expect "#")' % (pre, state))
-                        raise Exception
-            elif state == inend:
-                if inendpos == 3:
-                    if x == '\n':
-                        inendpos = 0
-                        state = idle
-                        logger.debug('dispatching message')
-                        self._dispatch_message(message)
-                        # reset
-                        rest = buf.read()
-                        buf = StringIO()
-                        buf.write(rest)
-                        buf.seek(0)
-                        message = []
-                        expchunksize = chunksize = 0
-                        parsing_state11 = idle
-                        inendpos = parsing_pos11 = 0
-                        break
-                    else:
-                        logger.debug('%s (%s: expect newline)' % (pre, state))
-                        raise Exception
-            else:
-                logger.debug('%s (%s invalid state)' % (pre, state))
-                raise Exception
+            if left:
+                n = min(left, fill - pos)
+                if not n:
+                    break
+                if pos != msg_end:
+                    view = memoryview(buf)
+                    view[msg_end:msg_end + n] = view[pos:pos + n]
+                    del view
+                    self._metrics.bytes_moved += n
+                msg_end += n
+                pos += n
+                left -= n
+                if not left:
+                    self._metrics.frames_in += 1
+                continue
+            if pos == fill:
+                break
+            match = _CHUNK_HEADER_RE.match(buf, pos, fill)
+            if match is None:
+                if _CHUNK_HEADER_START_RE.match(buf, pos, fill) is None:
+                    raise TransportError('invalid base:1.1 frame at %r' % str(buf[pos:pos + 16]))
+                break # the rest of the header is yet to come
+            if match.group(1) is None: # end of chunks
+                if not msg_end:
+                    raise TransportError('invalid base:1.1 frame: message without chunks')
+                self._dispatch_buffer(msg_end, match.end())
+                return True
+            left = int(str(match.group(1)))
+            if left >= self._read_max:
+                self._large_chunks = True
+            if left > 4294967295:
+                raise TransportError('invalid base:1.1 frame: chunk size %d too large' % left)
+            pos = match.end()
+        self._msg_end, self._raw_pos, self._chunk_left = msg_end, pos, left
+        return False
+
+    def _chunked(self):
+        """Whether messages other than the HELLO are sent using v1.1 chunked
+        framing, rather than v1.0 EOM markers."""
+        if BASE_1_1 not in self._client_capabilities:
+            # we publish only v1.0 support
+            return False
+        if not self._server_capabilities:
+            raise Exception("HELLO msg was sent, but server capabilities are still not known")
+        if BASE_1_1 in self._server_capabilities:
+            return True
+        elif BASE_1_0 in self._server_capabilities:
+            return False
+        else:
+            raise Exception("No capabilities for writing data.")
+
+    def _frame(self, data):
+        """Returns the message *data* delimited as required by the negotiated
+        protocol version. The HELLO message always uses v1.0 EOM markers."""
+        if parse_root(data)[0] == qualify("hello"):
+            return "%s%s" % (data, self.MSG_DELIM)
+        # this is not a HELLO msg
+        if self._chunked():
+            # send using v1.1 chunked framing
+            return "\n#%s\n%s%s" % (len(data), data, self.END_DELIM)
+        return "%s%s" % (data, self.MSG_DELIM)
+
+    def _framed(self, message):
+        """Yields the pieces to write for *message*, a byte string or a
+        :class:`MessageStream`, framed as in :meth:`_frame` but without
+        copying it: chunks of at most :attr:`chunk_size` bytes in v1.1
+        framing. A stream is framed piece by piece as it is read."""
+        if isinstance(message, MessageStream):
+            pieces, hello = message, False
+        elif len(message) <= min(_COALESCE_SIZE, self._chunk_size):
+            yield self._frame(message)
+            return
+        else:
+            pieces, hello = (message,), parse_root(message)[0] == qualify("hello")
+        if not hello and self._chunked():
+            for piece in encode_chunks(pieces, self._chunk_size):
+                yield piece
+        else:
+            for piece in pieces:
+                yield piece
+            yield self.MSG_DELIM
 
-        self._message = message
-        self._expchunksize = expchunksize
-        self._curchunksize = curchunksize
-        self._parsing_state11 = state
-        self._inendpos = inendpos
-        self._buffer = buf
-        self._parsing_pos11 = self._buffer.tell()
-        logger.debug('parse11 ending ...')
+    def __set_chunk_size(self, size):
+        if not 0 < size <= 4294967295:
+            raise ValueError('Chunk size must be between 1 and 4294967295 bytes')
+        self._chunk_size = size
+
+    chunk_size = property(fget=lambda self: self._chunk_size, fset=__set_chunk_size)
+    "The size of the largest chunk sent in v1.1 chunked framing, by default :data:`CHUNK_SIZE`. Larger messages are split into several chunks."
 
 
 class SessionListener(object):
@@ -368,12 +618,15 @@ class SessionListener(object):
         Avoid time-intensive tasks in a callback's context.
     """
 
+    RAW_BUFFER = False
+    """Subclasses set this to `True` to have :meth:`callback` passed the XML document as a read-only :class:`buffer` of the message as it was received, rather than a string copy of it."""
+
     def callback(self, root, raw):
         """Called when a new XML document is received. The *root* argument allows the callback to determine whether it wants to further process the document.
 
         Here, *root* is a tuple of *(tag, attributes)* where *tag* is the qualified name of the root element and *attributes* is a dictionary of its attributes (also qualified names).
 
-        *raw* will contain the XML document as a string.
+        *raw* will contain the XML document as a string, or as a read-only :class:`buffer` if :attr:`RAW_BUFFER` is set.
         """
         raise NotImplementedError
 
@@ -384,6 +637,13 @@ class SessionListener(object):
         """
         raise NotImplementedError
 
+    def reconnecting(self, ex):
+        """Called instead of :meth:`errback` when a :class:`~ncclient.transport.ResilientSession` lost its transport with the error *ex* and is about to reconnect, after which it sends again every request that is still unanswered.
+
+        Returns the message-id's of the requests that must not be sent again, an empty sequence by default.
+        """
+        return ()
+
 
 class HelloHandler(SessionListener):
 
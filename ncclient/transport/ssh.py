@@ -16,23 +16,42 @@
 import os
 import socket
 import getpass
+import inspect
+import time
 from binascii import hexlify
-from cStringIO import StringIO
+from functools import partial
 from select import select
+from threading import Thread, Lock, Timer
 
 import paramiko
 
-from errors import AuthenticationError, SessionCloseError, SSHError, SSHUnknownHostError
-from session import Session, Rfc4742Session
+from errors import AuthenticationError, SessionCloseError, SessionDeadError, SessionTimeoutError, SSHError, SSHUnknownHostError
+import keys
+import resolver
+import profiles
+from session import Rfc4742Session
+from trace import message_id
 from ncclient.xml_ import *
 
 import logging
 logger = logging.getLogger("ncclient.transport.ssh")
 
 BUF_SIZE = 4096
+# upper bound for the adaptive read size
+MAX_BUF_SIZE = 1 << 20
 
 TICK = 0.1
 
+# seconds between write attempts while the channel's send window is full
+RETRY = 0.01
+
+# whether channels can be given their window and packet sizes when opened,
+# as of paramiko 1.15
+_OPEN_SESSION_ARGS = inspect.getargspec(paramiko.Transport.open_session).args
+
+# a get-config selecting nothing, about the cheapest request with a reply
+PROBE = """<?xml version="1.0" encoding="UTF-8"?><rpc xmlns="urn:ietf:params:xml:ns:netconf:base:1.0" message-id="%s"><get-config><source><running/></source><filter type="subtree"/></get-config></rpc>"""
+
 def default_unknown_host_cb(host, fingerprint):
     """An unknown host callback returns `True` if it finds the key acceptable, and `False` if not.
 
@@ -52,186 +71,63 @@ def _colonify(fp):
         finga += ":" + fp[idx:idx+2]
     return finga
 
+class _Liveness(object):
+
+    def __init__(self, interval, timeout, probe, dead_cb):
+        self.interval = interval
+        self.timeout = timeout
+        self.probe = probe
+        self.dead_cb = dead_cb
+        self.sent = None # time the outstanding check was sent
+
+
+class _SharedTransport(object):
+
+    "Reference count on a `paramiko.Transport` carrying several NETCONF sessions, the last one to leave closes it."
+
+    def __init__(self, transport):
+        self.transport = transport
+        self._lock = Lock()
+        self._users = 1
+        # paramiko tracks a single outstanding global request per transport
+        self.keepalive_lock = Lock()
+
+    def acquire(self):
+        with self._lock:
+            self._users += 1
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            last = self._users == 0
+        if last and self.transport.is_active():
+            self.transport.close()
+
+
 class SSHSession(Rfc4742Session):
     """
     Implements a :rfc:`4742` NETCONF session over SSH.
     """
 
     def __init__(self, capabilities):
-        Session.__init__(self, capabilities)
-        self._host_keys = paramiko.HostKeys()
+        super(SSHSession, self).__init__(capabilities)
+        self._host_keys = [] # HostKeyStore's
         self._transport = None
+        self._shared = None # set while holding a reference on the transport
         self._connected = False
         self._channel = None
-
-    def _parse10(self):
-
-        """Messages are delimited by MSG_DELIM. The buffer could have grown by
-        a maximum of BUF_SIZE bytes everytime this method is called. Retains
-        state across method calls and if a byte has been read it will not be
-        considered again."""
-
-        logger.debug("parsing netconf v1.0")
-        delim = self.MSG_DELIM
-        n = len(delim) - 1
-        expect = self._parsing_state10
-        buf = self._buffer
-        buf.seek(self._parsing_pos10)
-        while True:
-            x = buf.read(1)
-            if not x: # done reading
-                break
-            elif x == delim[expect]: # what we expected
-                expect += 1 # expect the next delim char
-            else:
-                expect = 0
-                continue
-            # loop till last delim char expected, break if other char encountered
-            for i in range(expect, n):
-                x = buf.read(1)
-                if not x: # done reading
-                    break
-                if x == delim[expect]: # what we expected
-                    expect += 1 # expect the next delim char
-                else:
-                    expect = 0 # reset
-                    break
-            else: # if we didn't break out of the loop, full delim was parsed
-                msg_till = buf.tell() - n
-                buf.seek(0)
-                logger.debug('parsed new message')
-                self._dispatch_message(buf.read(msg_till).strip())
-                buf.seek(n+1, os.SEEK_CUR)
-                rest = buf.read()
-                buf = StringIO()
-                buf.write(rest)
-                buf.seek(0)
-                expect = 0
-        self._buffer = buf
-        self._parsing_state = expect
-        self._parsing_pos10 = self._buffer.tell()
-
-    def _parse11(self):
-        logger.debug("parsing netconf v1.1")
-        message = self._message 
-        expchunksize = self._expchunksize
-        curchunksize = self._curchunksize
-        idle, instart, inmsg, inbetween, inend = range(5)
-        state = self._parsing_state11
-        inendpos = self._inendpos
-        MAX_STARTCHUNK_SIZE = 10 # 4294967295
-        pre = 'invalid base:1:1 frame'
-        buf = self._buffer
-        buf.seek(self._parsing_pos11)
-        num = []
-
-        while True:
-            x = buf.read(1)
-            if not x: break # done reading
-            logger.debug('x: %s', x)
-            if state == idle:
-                if x == '\n':
-                    state = instart
-                    inendpos = 1
-                else:
-                    logger.debug('%s (%s: expect newline)'%(pre, state))
-                    raise Exception
-            elif state == instart:
-                if inendpos == 1:
-                    if x == '#':
-                        inendpos += 1
-                    else:
-                        logger.debug('%s (%s: expect "#")'%(pre, state))
-                        raise Exception
-                elif inendpos == 2:
-                    if x.isdigit():
-                        inendpos += 1 # == 3 now #
-                        num.append(x)
-                    else:
-                        logger.debug('%s (%s: expect digit)'%(pre, state))
-                        raise Exception
-                else:
-                    if inendpos == MAX_STARTCHUNK_SIZE:
-                        logger.debug('%s (%s: no. too long)'%(pre, state))
-                        raise Exception
-                    elif x == '\n':
-                        num = ''.join(num)
-                        try: num = long(num)
-                        except:
-                            logger.debug('%s (%s: invalid no.)'%(pre, state))
-                            raise Exception
-                        else:
-                            state = inmsg
-                            expchunksize = num
-                            logger.debug('response length: %d'%expchunksize)
-                            curchunksize = 0
-                            inendpos += 1
-                    elif x.isdigit():
-                        inendpos += 1 # > 3 now #
-                        num.append(x)
-                    else:
-                        logger.debug('%s (%s: expect digit)'%(pre, state))
-                        raise Exception
-            elif state == inmsg:
-                message.append(x)
-                curchunksize += 1
-                chunkleft = expchunksize - curchunksize
-                if chunkleft == 0:
-                    inendpos = 0
-                    state = inbetween
-                    message = ''.join(message)
-                    logger.debug('parsed new message: %s'%(message))
-            elif state == inbetween:
-                if inendpos == 0:
-                    if x == '\n': inendpos += 1
-                    else:
-                        logger.debug('%s (%s: expect newline)'%(pre, state))
-                        raise Exception
-                elif inendpos == 1:
-                    if x == '#': inendpos += 1
-                    else:
-                        logger.debug('%s (%s: expect "#")'%(pre, state))
-                        raise Exception
-                else:
-                    if x == '#':
-                        inendpos += 1 # == 3 now #
-                        state = inend
-                    else:
-                        logger.debug('%s (%s: expect "#")'%(pre, state))
-                        raise Exception
-            elif state == inend:
-                if inendpos == 3:
-                    if x == '\n':
-                        inendpos = 0
-                        state = idle
-                        logger.debug('dispatching message')
-                        self._dispatch_message(message)
-                        # reset
-                        rest = buf.read()
-                        buf = StringIO()
-                        buf.write(rest)
-                        buf.seek(0)
-                        message = []
-                        expchunksize = chunksize = 0
-                        parsing_state11 = idle
-                        inendpos = parsing_pos11 = 0
-                        break
-                    else:
-                        logger.debug('%s (%s: expect newline)'%(pre, state))
-                        raise Exception
-            else:
-                logger.debug('%s (%s invalid state)'%(pre, state))
-                raise Exception
-
-        self._message = message
-        self._expchunksize = expchunksize
-        self._curchunksize = curchunksize
-        self._parsing_state11 = state
-        self._inendpos = inendpos
-        self._buffer = buf
-        self._parsing_pos11 = self._buffer.tell()
-        logger.debug('parse11 ending ...')
-
+        self._fd = None # the channel's, see _read_fd()
+        self._read_size = BUF_SIZE # adapted to the incoming traffic
+        self._window_size = None
+        self._max_packet_size = None
+        self._close_lock = Lock()
+        self._profile_key = None # (host, port)
+        self._profile = {}
+        self._liveness = None
+        self._last_rx = time.time() # when data was last received
+        self._probe_id = None # message-id of the outstanding NETCONF probe
+        self._probes = 0
+        self._closing = False
 
     def load_known_hosts(self, filename=None):
 
@@ -239,30 +135,70 @@ class SSHSession(Rfc4742Session):
         be called multiple times.
 
         If *filename* is not specified, looks in the default locations i.e. :file:`~/.ssh/known_hosts` and :file:`~/ssh/known_hosts` for Windows.
+
+        The file is parsed once per process and shared by all sessions, see :func:`~ncclient.transport.keys.known_hosts`.
         """
 
         if filename is None:
             filename = os.path.expanduser('~/.ssh/known_hosts')
             try:
-                self._host_keys.load(filename)
+                store = keys.known_hosts(filename)
             except IOError:
                 # for windows
                 filename = os.path.expanduser('~/ssh/known_hosts')
                 try:
-                    self._host_keys.load(filename)
+                    store = keys.known_hosts(filename)
                 except IOError:
-                    pass
+                    return
         else:
-            self._host_keys.load(filename)
+            store = keys.known_hosts(filename)
+        if store not in self._host_keys:
+            self._host_keys.append(store)
 
     def close(self):
-        if self._transport.is_active():
-            self._transport.close()
-        self._connected = False
+        # also called by the main loop on its way out; the lock keeps it from
+        # closing the transport under a channel close still in progress
+        self._closing = True
+        with self._close_lock:
+            if self._channel is not None:
+                self._channel.close()
+            shared, self._shared = self._shared, None
+            if shared is not None:
+                shared.release()
+            self._connected = False
+        if self._reactor is not None:
+            self._reactor.remove(self)
+
+    def open_channel(self):
+        """Opens another NETCONF session as a new channel on the SSH transport of this connected session, skipping key exchange and authentication. It does its own hello exchange and gets its own `session-id`; the transport is closed along with the last session using it.
+
+        Returns the new, connected :class:`SSHSession`."""
+        if not self._connected or self._shared is None or not self._transport.is_active():
+            raise SSHError('Not connected')
+        start = time.time()
+        session = self.__class__(self._client_capabilities)
+        session._host_keys = self._host_keys
+        session._window_size = self._window_size
+        session._max_packet_size = self._max_packet_size
+        session._profile_key = self._profile_key
+        session._profile = self._profile
+        session._transport = self._transport
+        self._shared.acquire()
+        session._shared = self._shared
+        try:
+            session._connected = True
+            session._phase('channel', None, session._open_netconf_channel)
+            session._post_connect()
+        except:
+            session.close()
+            raise
+        session._metrics.connect_duration = time.time() - start
+        return session
 
     # REMEMBER to update transport.rst if sig. changes, since it is hardcoded there
     def connect(self, host, port=830, timeout=None, unknown_host_cb=default_unknown_host_cb,
-                username=None, password=None, key_filename=None, allow_agent=True, look_for_keys=True):
+                username=None, password=None, key_filename=None, allow_agent=True, look_for_keys=True,
+                window_size=None, max_packet_size=None, connect_timeout=None, remember_host_key=False):
         """Connect via SSH and initialize the NETCONF session. First attempts the publickey authentication method and then password authentication.
 
         To disable attempting publickey authentication altogether, call with *allow_agent* and *look_for_keys* as `False`.
@@ -271,7 +207,7 @@ class SSHSession(Rfc4742Session):
 
         *port* is by default 830, but some devices use the default SSH port of 22 so this may need to be specified
 
-        *timeout* is an optional timeout for socket connect
+        *timeout* is an optional timeout in seconds applied to each phase of connecting: resolving *host*, the socket connect, key exchange, authentication, opening the channel and the hello exchange. Resolved addresses are cached (see :data:`~ncclient.transport.resolver.resolver`) and tried concurrently, see :func:`~ncclient.transport.resolver.connect_any`
 
         *unknown_host_cb* is called when the server host key is not recognized. It takes two arguments, the hostname and the fingerprint (see the signature of :func:`default_unknown_host_cb`)
 
@@ -284,97 +220,224 @@ class SSHSession(Rfc4742Session):
         *allow_agent* enables querying SSH agent (if found) for keys
 
         *look_for_keys* enables looking in the usual locations for ssh keys (e.g. :file:`~/.ssh/id_*`)
-        """
-        if username is None:
-            username = getpass.getuser()
 
-        sock = None
-        for res in socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM):
-            af, socktype, proto, canonname, sa = res
-            try:
-                sock = socket.socket(af, socktype, proto)
-                sock.settimeout(timeout)
-            except socket.error:
-                continue
-            try:
-                sock.connect(sa)
-            except socket.error:
-                sock.close()
-                continue
-            break
-        else:
-            raise SSHError("Could not open socket to %s:%s" % (host, port))
+        *window_size* if specified is the SSH channel window size in bytes, raise it to have large replies streamed with fewer window adjustments
 
-        t = self._transport = paramiko.Transport(sock)
-        t.set_log_channel(logger.name)
+        *max_packet_size* if specified is the maximum SSH packet size in bytes for the channel. Both apply to the channel as it is opened; paramiko before 1.15 (e.g. the 1.9 of :file:`requirements.txt`) takes them from the transport, on which they are set instead
 
-        try:
-            t.start_client()
-        except paramiko.SSHException:
-            raise SSHError('Negotiation failed')
+        *connect_timeout* is an optional deadline in seconds for the whole of connecting
 
-        # host key verification
-        server_key = t.get_remote_server_key()
-        known_host = self._host_keys.check(host, server_key)
+        *remember_host_key* if `True` has the key of an unknown host which *unknown_host_cb* accepted recorded in the first :file:`known_hosts` file loaded (see :meth:`load_known_hosts`), so that it is known from then on
 
-        fingerprint = _colonify(hexlify(server_key.get_fingerprint()))
+        Running out of either timeout raises :exc:`~ncclient.transport.errors.SessionTimeoutError` naming the phase. The time spent in each phase is recorded in :attr:`~ncclient.metrics.SessionMetrics.connect_phases`.
 
-        if not known_host and not unknown_host_cb(host, fingerprint):
-            raise SSHUnknownHostError(host, fingerprint)
+        The authentication method and channel type that worked for *host* and *port* are remembered and tried first the next time, see :mod:`~ncclient.transport.profiles`.
+        """
+        start = time.time()
+        self._window_size = window_size
+        self._max_packet_size = max_packet_size
+        self._profile_key = (host, port)
+        self._profile = profiles.profiles.get(host, port)
+        if username is None:
+            username = getpass.getuser()
 
-        if key_filename is None:
-            key_filenames = []
-        elif isinstance(key_filename, basestring):
-            key_filenames = [ key_filename ]
-        else:
-            key_filenames = key_filename
+        deadline = start + connect_timeout if connect_timeout is not None else None
+        phases = self._metrics.connect_phases
+        def limit(phase):
+            # seconds allowed for the next phase
+            if deadline is None:
+                return timeout
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise SessionTimeoutError(phase, connect_timeout)
+            return remaining if timeout is None else min(timeout, remaining)
+
+        phase_start = time.time()
+        lim = limit('dns')
+        try:
+            addrs = resolver.resolver.getaddrinfo(host, port, lim)
+        except socket.timeout:
+            raise SessionTimeoutError('dns', lim)
+        except socket.error as e:
+            raise SSHError("Could not resolve %s: %s" % (host, e))
+        phases['dns'] = time.time() - phase_start
+
+        phase_start = time.time()
+        lim = limit('tcp')
+        try:
+            sock = resolver.connect_any(addrs, lim)
+        except socket.error as e:
+            # the addresses may have moved on
+            resolver.resolver.forget(host, port)
+            if isinstance(e, socket.timeout):
+                raise SessionTimeoutError('tcp', lim)
+            raise SSHError("Could not open socket to %s:%s" % (host, port))
+        sock.settimeout(timeout)
+        phases['tcp'] = time.time() - phase_start
 
-        self._auth(username, password, key_filenames, allow_agent, look_for_keys)
+        connected = False
+        try:
+            t = self._transport = paramiko.Transport(sock)
+            t.set_log_channel(logger.name)
+            self._shared = _SharedTransport(t)
 
-        self._connected = True # there was no error authenticating
+            def kex():
+                try:
+                    t.start_client()
+                except paramiko.SSHException:
+                    raise SSHError('Negotiation failed')
+            self._phase('kex', limit('kex'), kex)
+
+            # host key verification
+            phase_start = time.time()
+            server_key = t.get_remote_server_key()
+            known_host = False
+            for store in self._host_keys:
+                if store.check(host, server_key):
+                    known_host = True
+                    break
 
-        c = self._channel = self._transport.open_session()
-        c.set_name("netconf-subsystem")
-        try: c.invoke_subsystem("netconf")
-        except paramiko.SSHException as e:
-          logger.info("%s (subsystem request rejected)", e)
-          # if a ssh server implementation does not have subsystem support
-          # (dropbear for instance) then fallback to a remote command
-          # invocation. The server side must have netconf in the SEARCH PATH
-          # to allow the communication to work.
-          c = self._channel = self._transport.open_session()
-          c.set_name("netconf-command")
-          c.exec_command("netconf")
+            fingerprint = _colonify(hexlify(server_key.get_fingerprint()))
 
-        self._post_connect()
+            if not known_host:
+                if not unknown_host_cb(host, fingerprint):
+                    raise SSHUnknownHostError(host, fingerprint)
+                if remember_host_key and self._host_keys:
+                    self._host_keys[0].add(host, server_key)
+                    self._host_keys[0].flush()
+            phases['hostkey'] = time.time() - phase_start
 
-    # on the lines of paramiko.SSHClient._auth()
-    def _auth(self, username, password, key_filenames, allow_agent,
-              look_for_keys):
-        saved_exception = None
+            if key_filename is None:
+                key_filenames = []
+            elif isinstance(key_filename, basestring):
+                key_filenames = [ key_filename ]
+            else:
+                key_filenames = key_filename
+
+            self._phase('auth', limit('auth'), self._auth,
+                        username, password, key_filenames, allow_agent, look_for_keys)
+
+            self._connected = True # there was no error authenticating
+
+            self._phase('channel', limit('channel'), self._open_netconf_channel)
+            self._post_connect(limit('hello'))
+            self._metrics.connect_duration = time.time() - start
+            connected = True
+        finally:
+            if not connected:
+                # neither the paramiko thread nor the socket is to outlive a
+                # failed connect
+                self.close()
+                if self._transport is not None:
+                    self._transport.close()
+                sock.close()
+
+    def _phase(self, name, limit, fn, *args):
+        """Calls *fn* as connect phase *name* and records its duration. If it
+        takes longer than *limit* seconds, the transport is closed from under
+        it and :exc:`SessionTimeoutError` raised."""
+        start = time.time()
+        expired = []
+        timer = None
+        if limit is not None:
+            def expire():
+                expired.append(True)
+                self._transport.close()
+            timer = Timer(limit, expire)
+            timer.setDaemon(True)
+            timer.start()
+        try:
+            try:
+                result = fn(*args)
+            except Exception:
+                if expired:
+                    raise SessionTimeoutError(name, limit)
+                raise
+            if expired:
+                raise SessionTimeoutError(name, limit)
+            return result
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self._metrics.connect_phases[name] = time.time() - start
+
+    def _open_netconf_channel(self):
+        # if a ssh server implementation does not have subsystem support
+        # (dropbear for instance) then fallback to a remote command
+        # invocation. The server side must have netconf in the SEARCH PATH
+        # to allow the communication to work.
+        modes = ['subsystem', 'exec']
+        if self._profile.get('channel') == 'exec':
+            modes.reverse()
+        for mode in modes:
+            c = self._channel = self._open_channel()
+            try:
+                if mode == 'subsystem':
+                    c.set_name("netconf-subsystem")
+                    c.invoke_subsystem("netconf")
+                else:
+                    c.set_name("netconf-command")
+                    c.exec_command("netconf")
+            except paramiko.SSHException as e:
+                if mode == modes[-1]:
+                    raise
+                logger.info("%s (%s request rejected)", e, mode)
+                c.close()
+                continue
+            self._remember(channel=mode)
+            return
+
+    def _open_channel(self):
+        kwds = {}
+        if self._window_size is not None:
+            kwds['window_size'] = self._window_size
+        if self._max_packet_size is not None:
+            kwds['max_packet_size'] = self._max_packet_size
+        if not kwds or 'window_size' in _OPEN_SESSION_ARGS:
+            return self._transport.open_session(**kwds)
+        # before paramiko 1.15 channels take their sizes from the transport
+        for name, value in kwds.items():
+            if not hasattr(self._transport, name):
+                raise SSHError("paramiko %s cannot set the channel's %s" % (paramiko.__version__, name))
+            setattr(self._transport, name, value)
+        return self._transport.open_session()
+
+    def _recv(self, chan):
+        """Reads everything the channel has buffered, so that the framer runs
+        once per wakeup rather than once per BUF_SIZE, as a list of the
+        strings read, each of which goes into the message buffer as it is
+        rather than being joined with the others first. The read size doubles
+        while reads come back full and halves when traffic is light."""
+        size = self._read_size
+        data = chan.recv(size)
+        if not data:
+            raise SessionCloseError(self._received())
+        parts = [data]
+        full = len(data) == size
+        while chan.recv_ready():
+            data = chan.recv(size)
+            if not data:
+                break # closed; noticed on the next select
+            parts.append(data)
+            full = full or len(data) == size
+        if full:
+            self._read_size = min(size * 2, MAX_BUF_SIZE)
+        elif len(parts) == 1 and len(parts[0]) < size // 4:
+            self._read_size = max(size // 2, BUF_SIZE)
+        return parts
+
+    def _auth_methods(self, password, key_filenames, allow_agent, look_for_keys):
+        "Returns a list of *(method, name, key loader)* in the order they are to be tried."
+        methods = []
 
         for key_filename in key_filenames:
-            for cls in (paramiko.RSAKey, paramiko.DSSKey):
-                try:
-                    key = cls.from_private_key_file(key_filename, password)
-                    logger.debug("Trying key %s from %s" %
-                              (hexlify(key.get_fingerprint()), key_filename))
-                    self._transport.auth_publickey(username, key)
-                    return
-                except Exception as e:
-                    saved_exception = e
-                    logger.debug(e)
+            methods.append(('publickey', key_filename,
+                            partial(keys.private_keys.load, key_filename, password)))
 
         if allow_agent:
-            for key in paramiko.Agent().get_keys():
-                try:
-                    logger.debug("Trying SSH agent key %s" %
-                                 hexlify(key.get_fingerprint()))
-                    self._transport.auth_publickey(username, key)
-                    return
-                except Exception as e:
-                    saved_exception = e
-                    logger.debug(e)
+            for key in keys.agent_keys.get_keys():
+                methods.append(('agent', hexlify(key.get_fingerprint()),
+                                partial(lambda key: key, key)))
 
         keyfiles = []
         if look_for_keys:
@@ -393,19 +456,34 @@ class SSHSession(Rfc4742Session):
                 keyfiles.append((paramiko.DSSKey, dsa_key))
 
         for cls, filename in keyfiles:
-            try:
-                key = cls.from_private_key_file(filename, password)
-                logger.debug("Trying discovered key %s in %s" %
-                          (hexlify(key.get_fingerprint()), filename))
-                self._transport.auth_publickey(username, key)
-                return
-            except Exception as e:
-                saved_exception = e
-                logger.debug(e)
+            methods.append(('publickey', filename,
+                            partial(keys.private_keys.load, filename, password, (cls,))))
 
         if password is not None:
+            methods.append(('password', None, None))
+
+        return methods
+
+    # on the lines of paramiko.SSHClient._auth()
+    def _auth(self, username, password, key_filenames, allow_agent,
+              look_for_keys):
+        saved_exception = None
+
+        methods = self._auth_methods(password, key_filenames, allow_agent, look_for_keys)
+        # whatever worked last time goes first, the sort is stable
+        remembered = (self._profile.get('auth'), self._profile.get('key'))
+        methods.sort(key=lambda m: m[:2] != remembered)
+
+        for method, name, load in methods:
             try:
-                self._transport.auth_password(username, password)
+                if load is None:
+                    self._transport.auth_password(username, password)
+                else:
+                    key = load()
+                    logger.debug("Trying %s key %s (%s)", method,
+                                 hexlify(key.get_fingerprint()), name)
+                    self._transport.auth_publickey(username, key)
+                self._remember(auth=method, key=name)
                 return
             except Exception as e:
                 saved_exception = e
@@ -417,72 +495,125 @@ class SSHSession(Rfc4742Session):
 
         raise AuthenticationError("No authentication methods available")
 
+    def _remember(self, **fields):
+        if self._profile_key is not None:
+            self._profile.update(fields)
+            profiles.profiles.update(*self._profile_key, **fields)
+
+    def set_liveness(self, interval, timeout=None, probe=False, dead_cb=None):
+        """Checks that the peer is still there whenever nothing has been received for *interval* seconds, so that a session which died silently (e.g. dropped by a NAT or firewall) is noticed without waiting on an RPC. Call with *interval* as `None` to stop checking.
+
+        The check is an SSH keepalive request, or with *probe* as `True` a `get-config` selecting nothing, which also shows that the NETCONF server is responsive. Its reply is not delivered to listeners.
+
+        If nothing is received within *timeout* seconds (by default *interval*) of a check, the session is closed and :exc:`~ncclient.transport.errors.SessionDeadError` delivered to the listeners, which fails any pending RPC right away.
+
+        *dead_cb* if specified is called with the session as argument once it has died, for whatever reason other than :meth:`close`.
+        """
+        if interval is None:
+            self._liveness = None
+        else:
+            self._liveness = _Liveness(interval, timeout if timeout is not None else interval, probe, dead_cb)
+            if self._reactor is not None:
+                self._reactor.refresh()
+
+    def _check_liveness(self):
+        live = self._liveness
+        now = time.time()
+        if live.sent is not None:
+            if self._last_rx >= live.sent:
+                live.sent = None
+            elif now - live.sent > live.timeout:
+                raise SessionDeadError(live.timeout)
+        elif now - self._last_rx >= live.interval:
+            live.sent = now
+            if live.probe:
+                self._probes += 1
+                self._probe_id = 'ncclient-probe-%d' % self._probes
+                self.send(PROBE % self._probe_id)
+            else:
+                t = Thread(target=self._keepalive, name='keepalive')
+                t.setDaemon(True)
+                t.start()
+
+    def _keepalive(self):
+        shared = self._shared
+        if shared is None:
+            return
+        with shared.keepalive_lock:
+            # blocks until answered (whether accepted or refused) or the transport dies
+            self._transport.global_request('keepalive@openssh.com', wait=True)
+            if self._transport.is_active():
+                self._last_rx = time.time()
+
+    def _dispatch_message(self, raw):
+        if self._probe_id is not None and message_id(raw) == self._probe_id:
+            self._probe_id = None
+            return
+        super(SSHSession, self)._dispatch_message(raw)
+
+    def _read_fd(self):
+        # kept, as closing the channel closes it
+        if self._fd is None:
+            self._fd = self._channel.fileno()
+        return self._fd
+
+    def _read(self):
+        self._last_rx = time.time()
+        for data in self._recv(self._channel):
+            self._parse(data)
+
+    def _write(self, data):
+        # the channel cannot signal writability, the reactor retries
+        if not self._channel.send_ready():
+            return 0
+        n = self._channel.send(data)
+        if n <= 0:
+            raise SessionCloseError(self._received(), str(data))
+        return n
+
+    def _ticking(self):
+        return self._liveness is not None
+
+    def _io_tick(self):
+        if self._liveness is not None:
+            self._check_liveness()
+
+    def _io_error(self, err):
+        died = not self._closing
+        self.close()
+        self._dispatch_error(err)
+        live = self._liveness
+        if died and live is not None and live.dead_cb is not None:
+            live.dead_cb(self)
+
     def run(self):
         chan = self._channel
         q = self._q
-
-        def start_delim(data_len): return '\n#%s\n'%(data_len)
+        self._last_rx = time.time()
 
         try:
             while True:
 
                 # select on a paramiko ssh channel object does not ever return
                 # it in the writable list, so channels don't exactly emulate
-                # the socket api
+                # the socket api. While a message is partly written, come
+                # back right away if the send window has room, or shortly to
+                # check whether it has, reading whatever arrived meanwhile.
 
-                r, w, e = select([chan], [], [], TICK)
-
-                # will wakeup evey TICK seconds to check if something to send,
-                # more if something to read (due to select returning chan in
-                # readable list)
+                if self._out is not None:
+                    timeout = 0 if chan.send_ready() else RETRY
+                else:
+                    timeout = 0 if not q.empty() else TICK
+                r, w, e = select([chan], [], [], timeout)
 
                 if r:
-                    data = chan.recv(BUF_SIZE)
-                    if data:
-                        self._buffer.write(data)
-                        if self._server_capabilities:
-                            if 'urn:ietf:params:netconf:base:1.1' in self._server_capabilities and 'urn:ietf:params:netconf:base:1.1' in self._client_capabilities: self._parse11()
-                            elif 'urn:ietf:params:netconf:base:1.0' in self._server_capabilities or 'urn:ietf:params:netconf:base:1.0' in self._client_capabilities: self._parse10()
-                            else: raise Exception
-                        else: self._parse10() # HELLO msg uses EOM markers.
-                    else:
-                        raise SessionCloseError(self._buffer.getvalue())
-                if not q.empty() and chan.send_ready():
-                    data = q.get()
-                    try:
-                        # send a HELLO msg using v1.0 EOM markers.
-                        validated_element(data, tags='{urn:ietf:params:xml:ns:netconf:base:1.0}hello')
-                        data = "%s%s"%(data, self.MSG_DELIM)
-                    except XMLError:
-                        # this is not a HELLO msg
-                        # we publish v1.1 support
-                        if 'urn:ietf:params:netconf:base:1.1' in self._client_capabilities:
-                            if self._server_capabilities:
-                                if 'urn:ietf:params:netconf:base:1.1' in self._server_capabilities:
-                                    # send using v1.1 chunked framing
-                                    data = "%s%s%s"%(start_delim(len(data)), data, self.END_DELIM)
-                                elif 'urn:ietf:params:netconf:base:1.0' in self._server_capabilities:
-                                    # send using v1.0 EOM markers
-                                    data = "%s%s"%(data, self.MSG_DELIM)
-                                else: raise Exception
-                            else:
-                                logger.debug('HELLO msg was sent, but server capabilities are still not known')
-                                raise Exception
-                        # we publish only v1.0 support
-                        else:
-                            # send using v1.0 EOM markers
-                            data = "%s%s"%(data, self.MSG_DELIM)
-                    finally:
-                        logger.debug("Sending: %s", data)
-                        while data:
-                            n = chan.send(data)
-                            if n <= 0:
-                                raise SessionCloseError(self._buffer.getvalue(), data)
-                            data = data[n:]
+                    self._read()
+                if self._liveness is not None:
+                    self._check_liveness()
+                self._io_write()
         except Exception as e:
             logger.debug("Broke out of main loop, error=%r", e)
-            self.close()
-            self._dispatch_error(e)
+            self._io_error(e)
 
     @property
     def transport(self):
@@ -14,19 +14,39 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import os
+import sys
+import errno
 import fcntl
-from select import select
+import time
 from subprocess import Popen, PIPE
 
+from errors import SessionCloseError
 from session import Rfc4742Session
-from ncclient.xml_ import *
 
 import logging
 
 logger = logging.getLogger("ncclient.transport.stdio")
 
-TICK = 0.1
+READ_SIZE = 65536
+
+# fcntl commands for resizing a pipe, Linux only
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+F_GETPIPE_SZ = getattr(fcntl, 'F_GETPIPE_SZ', 1032)
+
+
+def _set_pipe_size(fd, size):
+    "Resizes the pipe *fd* where supported, returning its resulting size or `None`."
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        fcntl.fcntl(fd, F_SETPIPE_SZ, size)
+        return fcntl.fcntl(fd, F_GETPIPE_SZ)
+    except IOError as e:
+        # EPERM beyond /proc/sys/fs/pipe-max-size for unprivileged users
+        logger.debug("could not resize pipe to %d bytes: %r", size, e)
+        return None
 
 
 class StdIOSession(Rfc4742Session):
@@ -34,87 +54,81 @@ class StdIOSession(Rfc4742Session):
         super(StdIOSession, self).__init__(capabilities)
         self._process = None
         self._connected = False
+        self._stdin = None # raw fds of the child's stdin
+        self._stdout = None # ... and stdout
+        self._reader = None
+        self._read_size = READ_SIZE
 
     def close(self):
         if self._process.poll() is None:
             self._process.terminate()
         self._connected = False
+        if self._reactor is not None:
+            self._reactor.remove(self)
 
-    def connect(self, path):
+    def connect(self, path, pipe_size=None, read_size=READ_SIZE, timeout=None):
         """
         Create a subprocess with a NETCONF server that communicates with ncclient
         using piped stdio.
 
         Arguments:
             *path* - path to the server binary
+
+            *pipe_size* - if specified, the size in bytes both pipes are resized to (Linux only, capped by :file:`/proc/sys/fs/pipe-max-size`)
+
+            *read_size* - the maximum number of bytes read at once; raised to the pipe size if that is larger
+
+            *timeout* - if specified, the seconds to wait for the server's hello before raising :exc:`~ncclient.transport.errors.SessionTimeoutError`
         """
-        self._process = Popen(path, shell=False, bufsize=1,
+        start = time.time()
+        self._process = Popen(path, shell=False, bufsize=0,
                               stdin=PIPE, stdout=PIPE, stderr=open(os.devnull, "w"),
                               close_fds=True)
-        fcntl.fcntl(self._process.stdout.fileno(), fcntl.F_SETFL, os.O_NONBLOCK)
+        self._stdin = self._process.stdin.fileno()
+        self._stdout = self._process.stdout.fileno()
+        for fd in (self._stdin, self._stdout):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+            if pipe_size is not None:
+                size = _set_pipe_size(fd, pipe_size)
+                if size is not None:
+                    read_size = max(read_size, size)
+        self._reader = io.FileIO(self._stdout, 'r', closefd=False)
+        self._read_size = read_size
         self._connected = True
+        self._metrics.connect_phases['spawn'] = time.time() - start
+
+        self._post_connect(timeout)
+        self._metrics.connect_duration = time.time() - start
+
+    def _read(self):
+        """Reads what is available on the child's stdout into the parser, up
+        to the read size per wakeup so that a server streaming a large reply
+        does not hold up pending writes; the rest is read on the next."""
+        left = self._read_size
+        while left > 0:
+            n = self._read_into(self._reader.readinto, self._read_size)
+            if n is None: # EAGAIN, drained
+                return
+            if n == 0:
+                if not self._connected: # we closed it
+                    return
+                raise SessionCloseError(self._received())
+            left -= n
+
+    def _write(self, data):
+        "Writes as much of *data* as the pipe takes."
+        try:
+            return os.write(self._stdin, data)
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+            return 0
 
-        self._post_connect()
-
-    def run(self):
-        queue = self._q
-
-        start_delim = lambda data_len: '\n#%s\n' % data_len
+    def _read_fd(self):
+        return self._stdout
 
-        try:
-            while self._connected:
-                r, w, x = select([self._process.stdout], [], [], 0.1)
-
-                if r:
-                    # reading data
-                    data = r[0].read()
-                    if data:
-                        self._buffer.write(data)
-                        if self._server_capabilities:
-                            if 'urn:ietf:params:netconf:base:1.1' in self._server_capabilities and 'urn:ietf:params:netconf:base:1.1' in self._client_capabilities:
-                                self._parse11()
-                            elif 'urn:ietf:params:netconf:base:1.0' in self._server_capabilities or 'urn:ietf:params:netconf:base:1.0' in self._client_capabilities:
-                                self._parse10()
-                            else:
-                                raise Exception("No capabilities for reading data.")
-                        else:
-                            self._parse10()  # HELLO msg uses EOM markers.
-                if not queue.empty():
-                    # writing data
-                    data = queue.get()
-                    try:
-                        # send a HELLO msg using v1.0 EOM markers.
-                        validated_element(data, tags='{urn:ietf:params:xml:ns:netconf:base:1.0}hello')
-                        data = "%s%s" % (data, self.MSG_DELIM)
-                    except XMLError:
-                        # this is not a HELLO msg
-                        # we publish v1.1 support
-                        if 'urn:ietf:params:netconf:base:1.1' in self._client_capabilities:
-                            if self._server_capabilities:
-                                if 'urn:ietf:params:netconf:base:1.1' in self._server_capabilities:
-                                    # send using v1.1 chunked framing
-                                    data = "%s%s%s" % (start_delim(len(data)), data, self.END_DELIM)
-                                elif 'urn:ietf:params:netconf:base:1.0' in self._server_capabilities:
-                                    # send using v1.0 EOM markers
-                                    data = "%s%s" % (data, self.MSG_DELIM)
-                                else:
-                                    raise Exception("No capabilities for writing data.")
-                            else:
-                                logger.error('HELLO msg was sent, but server capabilities are still not known')
-                                raise
-                        # we publish only v1.0 support
-                        else:
-                            # send using v1.0 EOM markers
-                            data = "%s%s" % (data, self.MSG_DELIM)
-                    finally:
-                        logger.debug("Sending: %s", data)
-                        self._process.stdin.write(data)
-        except Exception as e:
-            logger.error("Broke out of main loop, error=%r", e)
-            self.close()
-            self._dispatch_error(e)
-
-        logger.debug("End of main loop.")
+    def _write_fd(self):
+        return self._stdin
 
     @property
     def process(self):
@@ -0,0 +1,88 @@
+# Copyright 2009 Shikhar Bhushan
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"Wire tracing of the NETCONF messages exchanged by a session"
+
+import re
+import time
+from collections import deque, namedtuple
+from threading import Lock
+
+IN = 'in'
+OUT = 'out'
+
+# only the head of a message is searched, the attribute lives on the root
+_MSGID_RE = re.compile(r'message-id=["\']([^"\']*)["\']')
+_MSGID_SEARCH_LEN = 512
+
+TraceRecord = namedtuple('TraceRecord',
+                         'time direction session_id message_id size sample')
+"""A single traced message. *direction* is either `'in'` or `'out'`, *size* is the length of the message in bytes and *sample* holds its first bytes (empty unless sampling was requested)."""
+
+
+def message_id(raw):
+    "Returns the `message-id` attribute found at the head of the XML document *raw*, or `None`."
+    m = _MSGID_RE.search(raw, 0, _MSGID_SEARCH_LEN)
+    if m is not None:
+        return str(m.group(1))
+
+
+class WireTrace(object):
+
+    """Records every message crossing a :class:`Session` once it is installed as the session's :attr:`~Session.trace`. While no trace is installed the session only pays for a `None` check.
+
+    *maxlen* is the number of :class:`TraceRecord` kept in the ring buffer, older records are dropped
+
+    *file* if specified is a filename or a file-like object, to which each record is also written as a line. Only a file opened from a filename is closed by :meth:`close`.
+
+    *sample* is the number of payload bytes to keep with each record (by default none)
+    """
+
+    def __init__(self, maxlen=1000, file=None, sample=0):
+        self._records = deque(maxlen=maxlen)
+        self._lock = Lock()
+        self._sample = sample
+        self._owns_file = isinstance(file, basestring)
+        if self._owns_file:
+            file = open(file, 'a')
+        self._file = file
+
+    def record(self, direction, session_id, raw):
+        "Records a message *raw* going in *direction* on the session identified by *session_id*."
+        rec = TraceRecord(time.time(), direction, session_id, message_id(raw),
+                          len(raw), str(raw[:self._sample]))
+        with self._lock:
+            self._records.append(rec)
+            if self._file is not None:
+                self._file.write('%.6f %s %s %s %d %r\n' % rec)
+                self._file.flush()
+
+    def clear(self):
+        "Drops all buffered records."
+        with self._lock:
+            self._records.clear()
+
+    def close(self):
+        "Stops writing records to the trace file, if any, closing it if it was opened from a filename."
+        with self._lock:
+            if self._file is not None:
+                if self._owns_file:
+                    self._file.close()
+                self._file = None
+
+    @property
+    def records(self):
+        "List of the buffered :class:`TraceRecord`, oldest first."
+        with self._lock:
+            return list(self._records)
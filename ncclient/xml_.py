@@ -15,7 +15,10 @@
 
 "Methods for creating, parsing, and dealing with XML and ElementTree objects."
 
+import os
+import re
 from cStringIO import StringIO
+from threading import local
 from xml.etree import cElementTree as ET
 
 # In case issues come up with XML generation/parsing
@@ -23,6 +26,9 @@ from xml.etree import cElementTree as ET
 
 from ncclient import NCClientError
 
+import logging
+logger = logging.getLogger("ncclient.xml_")
+
 class XMLError(NCClientError): pass
 
 ### Namespace-related
@@ -41,13 +47,19 @@ FLOWMON_1_0 = "http://www.liberouter.org/ns/netopeer/flowmon/1.0"
 JUNIPER_1_1 = "http://xml.juniper.net/xnm/1.1/xnm"
 #
 try:
-    register_namespace = ET.register_namespace
+    _register_namespace = ET.register_namespace
 except AttributeError:
-    def register_namespace(prefix, uri):
+    def _register_namespace(prefix, uri):
         from xml.etree import ElementTree
         # cElementTree uses ElementTree's _namespace_map, so that's ok
         ElementTree._namespace_map[uri] = prefix
-register_namespace.func_doc = "ElementTree's namespace map determines the prefixes for namespace URI's when serializing to XML. This method allows modifying this map to specify a prefix for a namespace URI."
+
+_prefixes = {} # namespace URI -> prefix, for engines without a global map
+
+def register_namespace(prefix, uri):
+    "ElementTree's namespace map determines the prefixes for namespace URI's when serializing to XML. This method allows modifying this map to specify a prefix for a namespace URI."
+    _register_namespace(prefix, uri)
+    _prefixes[uri] = prefix
 
 for (ns, pre) in {
     BASE_NS_1_0: 'nc',
@@ -59,24 +71,160 @@ for (ns, pre) in {
 }.items(): 
     register_namespace(pre, ns)
 
+### XML engines
+
+def _readable(x):
+    # a document received as a bytearray or memoryview as something the
+    # parsers take, without copying it where they allow
+    if isinstance(x, bytearray):
+        return buffer(x)
+    if isinstance(x, memoryview):
+        return x.tobytes()
+    return x
+
+class _ElementTree(object):
+
+    # xml.etree.cElementTree, always available
+
+    name = 'etree'
+
+    def __init__(self):
+        self.Element = ET.Element
+        self.SubElement = ET.SubElement
+        self.iselement = ET.iselement
+
+    def fromstring(self, x):
+        return ET.fromstring(_readable(x))
+
+    def tostring(self, ele, encoding):
+        return ET.tostring(ele, encoding)
+
+    def iterparse(self, source, events, tag):
+        for event, ele in ET.iterparse(source, events):
+            if tag is None or ele.tag in tag:
+                yield event, ele
+
+
+class _Lxml(object):
+
+    # lxml.etree, parsing without its safety limits on depth and text size
+    # (huge_tree) as replies of hundreds of megabytes are not unusual; it
+    # has no global namespace map, so registered prefixes are declared on
+    # the elements created
+
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import etree
+        self._etree = etree
+        self._local = local() # parsers are not to be shared between threads
+        self.iselement = etree.iselement
+
+    def _nsmap(self, tag, parent=None):
+        if tag[:1] != '{':
+            return None
+        uri = tag[1:tag.index('}')]
+        prefix = _prefixes.get(uri)
+        if prefix is None or parent is not None and parent.nsmap.get(prefix) == uri:
+            return None
+        return {prefix: uri}
+
+    def Element(self, tag, attrib={}, **extra):
+        return self._etree.Element(tag, attrib, self._nsmap(tag), **extra)
+
+    def SubElement(self, parent, tag, attrib={}, **extra):
+        return self._etree.SubElement(parent, tag, attrib, self._nsmap(tag, parent), **extra)
+
+    def fromstring(self, x):
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            parser = self._local.parser = self._etree.XMLParser(huge_tree=True)
+        if not isinstance(x, basestring):
+            x = str(_readable(x)) # only takes strings
+        return self._etree.fromstring(x, parser)
+
+    def tostring(self, ele, encoding):
+        return self._etree.tostring(ele, encoding=encoding)
+
+    def iterparse(self, source, events, tag):
+        return self._etree.iterparse(source, events=events, tag=tag, huge_tree=True)
+
+
+# by precedence when telling which engine an element belongs to, as
+# ElementTree takes anything with a tag for an element
+_ENGINES = (_Lxml, _ElementTree)
+
+_loaded = {} # name -> engine
+
+#: Environment variable naming the XML engine to use from the import of this module on, see :func:`use_engine`
+ENGINE_VARIABLE = 'NCCLIENT_XML_ENGINE'
+
+def use_engine(name):
+    """Selects the XML engine used from now on to parse, create and serialize elements: `'etree'` for :mod:`xml.etree.cElementTree`, the default, or `'lxml'` for :mod:`lxml.etree`, which is faster on large documents and parses replies of any size. Elements keep belonging to the engine they were created with, so switch between requests rather than while building one.
+
+    Raises :exc:`XMLError` if *name* is unknown or the engine is not available, i.e. lxml is not installed.
+    """
+    global _engine
+    engine = _loaded.get(name)
+    if engine is None:
+        for cls in _ENGINES:
+            if cls.name == name:
+                break
+        else:
+            raise XMLError("Unknown XML engine [%s]" % name)
+        try:
+            engine = _loaded[name] = cls()
+        except ImportError as e:
+            raise XMLError("XML engine [%s] is not available: %s" % (name, e))
+    _engine = engine
+
+def xml_engine():
+    "Returns the name of the XML engine in use, see :func:`use_engine`."
+    return _engine.name
+
+def _owner(ele):
+    for cls in _ENGINES:
+        engine = _loaded.get(cls.name)
+        if engine is not None and engine.iselement(ele):
+            return engine
+
+use_engine('etree')
+if os.environ.get(ENGINE_VARIABLE):
+    try:
+        use_engine(os.environ[ENGINE_VARIABLE])
+    except XMLError as e:
+        logger.warning("%s, using [etree]" % e)
+
 qualify = lambda tag, ns=BASE_NS_1_0: tag if ns is None else "{%s}%s" % (ns, tag)
 """Qualify a *tag* name with a *namespace*, in :mod:`~xml.etree.ElementTree` fashion i.e. *{namespace}tagname*."""
 
 def to_xml(ele, encoding="UTF-8"):
     "Convert and return the XML for an *ele* (:class:`~xml.etree.ElementTree.Element`) with specified *encoding*."
-    xml = ET.tostring(ele, encoding)
+    xml = (_owner(ele) or _engine).tostring(ele, encoding)
     return xml if xml.startswith('<?xml') else '<?xml version="1.0" encoding="%s"?>%s' % (encoding, xml)
 
 def to_ele(x):
-    "Convert and return the :class:`~xml.etree.ElementTree.Element` for the XML document *x*. If *x* is already an :class:`~xml.etree.ElementTree.Element` simply returns that."
-    return x if ET.iselement(x) else ET.fromstring(x)
+    "Convert and return the :class:`~xml.etree.ElementTree.Element` for the XML document *x*, a string, :class:`bytearray` or :class:`memoryview`. If *x* is already an :class:`~xml.etree.ElementTree.Element` simply returns that."
+    return x if iselement(x) else _engine.fromstring(x)
+
+def iselement(x):
+    "Whether *x* is an element of any of the XML engines in use."
+    return _owner(x) is not None
 
 def parse_root(raw):
-    "Efficiently parses the root element of a *raw* XML document, returning a tuple of its qualified name and attribute dictionary."
+    "Efficiently parses the root element of a *raw* XML document (a string or :class:`bytearray`), returning a tuple of its qualified name and attribute dictionary."
     fp = StringIO(raw)
-    for event, element in ET.iterparse(fp, events=('start',)):
+    for event, element in _engine.iterparse(fp, ('start',), None):
         return (element.tag, element.attrib)
 
+def iterparse(source, events=('end',), tag=None):
+    """Parses *source*, a file name or file-like object, incrementally with the XML engine in use, yielding `(event, element)` tuples for the *events* (any of `'start'`, `'end'`, `'start-ns'` and `'end-ns'`) as they occur. *tag* if specified is the qualified name of the elements to report, or a sequence of alternatives.
+
+    The elements reported are still attached to the tree being built, so clear those done with when parsing large documents."""
+    if isinstance(tag, basestring):
+        tag = (tag,)
+    return _engine.iterparse(source, events, tag)
+
 def validated_element(x, tags=None, attrs=None):
     """Checks if the root element of an XML document or Element meets the supplied criteria.
     
@@ -102,7 +250,118 @@ def validated_element(x, tags=None, attrs=None):
                 raise XMLError("Element [%s] does not have required attributes" % ele.tag)
     return ele
 
-new_ele = lambda tag, attrs={}, **extra: ET.Element(qualify(tag), attrs, **extra)
+new_ele = lambda tag, attrs={}, **extra: _engine.Element(qualify(tag), attrs, **extra)
+
+sub_ele = lambda parent, tag, attrs={}, **extra: (_owner(parent) or _engine).SubElement(parent, qualify(tag), attrs, **extra)
+
+### Locating elements in a document without parsing it
+
+# a start tag, its attributes and whether it is empty
+_START_TAG_RE = re.compile(r'<([\w.:-]+)((?:\s+[\w.:-]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*)\s*(/?)>')
+_ATTR_RE = re.compile(r'([\w.:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+# whitespace, comments and processing instructions (including the XML declaration)
+_MISC_RE = re.compile(r'(?:\s+|<!--.*?-->|<\?.*?\?>)*', re.S)
+
+def _text(raw):
+    # what regular expressions are matched against, for them to yield strings
+    return buffer(raw) if isinstance(raw, bytearray) else raw
+
+def _slice(raw, start, end):
+    return raw[start:end] if isinstance(raw, basestring) else str(buffer(raw, start, end - start))
+
+# bytes at a time _rfind() looks at in a buffer, from its end
+_RFIND_WINDOW = 1 << 16
+
+def _find(raw, sub, start):
+    # raw.find(sub, start), for buffers as well
+    if not isinstance(raw, buffer):
+        return raw.find(sub, start)
+    match = re.compile(re.escape(sub)).search(raw, start)
+    return match.start() if match is not None else -1
+
+def _rfind(raw, sub, start):
+    # raw.rfind(sub, start), for buffers as well, which are looked at a window
+    # at a time from the end rather than copied whole
+    if not isinstance(raw, buffer):
+        return raw.rfind(sub, start)
+    end = len(raw)
+    while end > start:
+        low = max(start, end - _RFIND_WINDOW)
+        pos = raw[low:end + len(sub) - 1].rfind(sub)
+        if pos >= 0:
+            return low + pos
+        end = low
+    return -1
+
+def _namespaces(attrs):
+    "Returns the namespace declarations among the *attrs* of a start tag, by prefix ('' for the default namespace)."
+    decls = {}
+    for name, dq, sq in _ATTR_RE.findall(attrs):
+        if name == 'xmlns':
+            decls[''] = dq or sq
+        elif name.startswith('xmlns:'):
+            decls[name[6:]] = dq or sq
+    return decls
+
+def root_children(raw, deep=()):
+    """Yields the child elements of the root of the XML document *raw* without parsing it, as tuples of their qualified tag, their start and end offsets in *raw* and the namespace declarations they inherit from the root (by prefix, `''` for the default namespace).
+
+    A child is taken to end at the first end tag of its name, i.e. not to contain an element of the same name -- except for those whose tag is among *deep*, which are taken to end at the last one in the document, i.e. to be the last of their name. Raises :exc:`ValueError` where *raw* turns out not to be laid out as expected.
+    """
+    text = _text(raw)
+    root = _START_TAG_RE.match(text, _MISC_RE.match(text).end())
+    if root is None or root.group(3):
+        raise ValueError('no root element with children')
+    inherited = _namespaces(root.group(2))
+    root_end = re.compile(r'</%s\s*>' % re.escape(root.group(1)))
+    pos = _MISC_RE.match(text, root.end()).end()
+    while True:
+        match = root_end.match(text, pos)
+        if match is not None:
+            if _MISC_RE.match(text, match.end()).end() != len(raw):
+                raise ValueError('content after the root element')
+            return
+        child = _START_TAG_RE.match(text, pos)
+        if child is None:
+            raise ValueError('text or markup other than elements at offset %d' % pos)
+        own = _namespaces(child.group(2))
+        prefix, _, local = child.group(1).rpartition(':')
+        tag = qualify(local, own.get(prefix, inherited.get(prefix)))
+        if child.group(3):
+            end = child.end()
+        else:
+            close = '</%s' % child.group(1)
+            if tag in deep:
+                close = _rfind(raw, close, child.end())
+            else:
+                close = _find(raw, close, child.end())
+            match = close >= 0 and re.compile(r'</%s\s*>' % re.escape(child.group(1))).match(text, close)
+            if not match:
+                raise ValueError('no end tag for %s' % child.group(1))
+            end = match.end()
+        yield tag, child.start(), end, dict([(p, uri) for p, uri in inherited.iteritems() if p not in own])
+        pos = _MISC_RE.match(text, end).end()
+
+def element_span(raw, tag):
+    """Locates the element *tag* (a qualified name) in the XML document *raw* without parsing it, given that it is the one and only child element of the root (see :func:`root_children`). Returns a tuple of its start and end offsets in *raw* and a dictionary of the namespace declarations it inherits from the root element, or `None` if it is not found that way."""
+    try:
+        children = list(root_children(raw, (tag,)))
+    except ValueError:
+        return None
+    if len(children) != 1 or children[0][0] != tag:
+        return None
+    return children[0][1:]
 
-sub_ele = lambda parent, tag, attrs={}, **extra: ET.SubElement(parent, qualify(tag), attrs, **extra)
+def detached(raw, start, end, namespaces):
+    "Returns the element spanning from *start* to *end* in the XML document *raw* as an XML string of its own, the *namespaces* it inherits (by prefix) declared on its start tag."
+    if not namespaces:
+        return _slice(raw, start, end)
+    decls = ''.join([' xmlns%s="%s"' % (':' + p if p else '', uri) for p, uri in namespaces.iteritems()])
+    name_end = _START_TAG_RE.match(_text(raw), start).end(1)
+    return ''.join([_slice(raw, start, name_end), decls, _slice(raw, name_end, end)])
 
+def element_xml(raw, tag):
+    """Returns the element *tag* of the XML document *raw* as an XML string, sliced from *raw* as it is rather than parsed and serialized again, under the conditions of :func:`element_span`. The namespace declarations it inherits are added to its start tag. Returns `None` if the element is not found that way."""
+    span = element_span(raw, tag)
+    if span is not None:
+        return detached(raw, *span)